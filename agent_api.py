@@ -25,6 +25,10 @@ from database_saas import saas_db, TaskStatus, TaskType, Platform
 # ═══════════════════════════════════════════════════════════════════════════
 agent_api = Blueprint('agent_api', __name__, url_prefix='/api/agent')
 
+# Task log lapméret határai
+TASK_LOGS_DEFAULT_LIMIT = 200
+TASK_LOGS_MAX_LIMIT = 500
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # AUTH DECORATOR
@@ -187,7 +191,7 @@ def get_task():
         }), 404
     
     # Update heartbeat
-    saas_db.update_agent_heartbeat(agent_id, platforms)
+    saas_db.update_agent_heartbeat(agent_id)
     
     # Get next task
     task = saas_db.get_next_task(agent_id, platforms)
@@ -348,7 +352,6 @@ def heartbeat():
     data = request.get_json()
     
     agent_id = data.get('agent_id')
-    platforms = data.get('platforms', [])
     
     if not agent_id:
         return jsonify({
@@ -367,7 +370,7 @@ def heartbeat():
         }), 404
     
     # Update heartbeat
-    saas_db.update_agent_heartbeat(agent_id, platforms)
+    saas_db.update_agent_heartbeat(agent_id)
     
     # Count pending tasks for user
     user_tasks = saas_db.get_user_tasks(request.current_user['id'], status='pending')
@@ -666,10 +669,14 @@ def get_task_logs(task_id):
     """
     Get execution logs for task.
     
+    Query params: ?limit=200 (1-500)
+                  &before=<created_at>&before_id=<id> of the oldest log already shown
+    
     Response:
     {
         "success": true,
-        "logs": [...]
+        "logs": [...],
+        "next_cursor": {"before": "...", "before_id": 123}  // null when empty
     }
     """
     # Validate task belongs to user
@@ -681,11 +688,31 @@ def get_task_logs(task_id):
             'code': 'NOT_FOUND'
         }), 404
     
-    logs = saas_db.get_task_logs(task_id)
+    try:
+        limit = int(request.args.get('limit', TASK_LOGS_DEFAULT_LIMIT))
+        before = request.args.get('before')
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id is not None else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit and before_id must be integers',
+            'code': 'BAD_REQUEST'
+        }), 400
+    if (before is None) != (before_id is None):
+        return jsonify({
+            'success': False,
+            'error': 'before and before_id must be given together',
+            'code': 'BAD_REQUEST'
+        }), 400
+    limit = max(1, min(limit, TASK_LOGS_MAX_LIMIT))
+    
+    logs = saas_db.get_task_logs(task_id, limit=limit, before=before, before_id=before_id)
     
     return jsonify({
         'success': True,
-        'logs': logs
+        'logs': logs,
+        'next_cursor': {'before': logs[0]['created_at'], 'before_id': logs[0]['id']} if logs else None
     })
 
 
@@ -3,6 +3,7 @@ TrendMaster - Flask Application
 Trending topics collector and Facebook post generator
 """
 from flask import Flask, render_template, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
@@ -10,29 +11,63 @@ from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 import os
 import atexit
+import functools
 import logging
+import logging.handlers
+import queue
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Request-path logger: handlers only enqueue records, a listener thread
+# does the actual stdout writes so workers never contend on the stdout lock.
+# Set up before the local imports so their 'trendmaster.*' loggers (e.g. the
+# post generator's start-up messages) already have a handler.
+log = logging.getLogger('trendmaster')
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_queue = queue.Queue(-1)
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # Import local modules
 from database import db
 from collector import TrendCollector
 from news_collector import NewsCollector
-from generator import PostGenerator
+from generator import PostGenerator, clear_rag_style_cache
 from google_ai import GoogleAIGenerator
 from publisher import SocialPublisher
 from super_trends import detector
 from media_spoofer import MediaSpoofer
-from facebook_poster import publish_to_facebook_sync
+from facebook_poster import publish_to_facebook_sync, publish_many_to_facebook_sync
+from document_parser import extract_document_text, SUPPORTED_EXTENSIONS
 
 # === ÚJ IMPORTS - SaaS rendszer ===
 from agent_api import agent_api
 from seo_api import seo_api
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """jsonify() via orjson - serializes straight to UTF-8 bytes, 3-5x faster"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        # Flask's default handler still covers Decimal, UUID, dataclasses, etc.
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'trendmaster-secret-key-2025')
 
 # CORS engedélyezése (Chrome extension támogatás)
@@ -65,6 +100,7 @@ AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai').lower()
 # Configure APScheduler logging
 logging.basicConfig()
 logging.getLogger('apscheduler').setLevel(logging.INFO)
+logging.getLogger('facebook_poster').setLevel(logging.INFO)
 
 # Scheduler for automatic trend collection
 scheduler = BackgroundScheduler({
@@ -100,10 +136,10 @@ def collect_trends_job():
         google_news_us = []
         regular_news = []
 
-        for article in news_articles:
-            # Save to database
-            db.save_news_article(article)
+        # Save to database (one transaction for the whole batch)
+        db.save_news_articles(news_articles)
 
+        for article in news_articles:
             # Categorize by source
             if article['source'] == 'Google News HU':
                 google_news_hu.append({
@@ -168,35 +204,41 @@ def publish_scheduled_posts_job():
         print(f"Found {len(pending_posts)} post(s) to publish")
         print(f"{'='*60}")
 
+        facebook_posts = []
         for post in pending_posts:
-            post_id = post['id']
-            post_content = post['post_content']
-            image_path = post.get('image_path')
-            video_path = post.get('video_path')
             platform = post.get('platform', 'facebook')
 
-            print(f"\n📤 Publishing scheduled post #{post_id}...")
+            print(f"\n📤 Publishing scheduled post #{post['id']}...")
             print(f"   Platform: {platform}")
-            print(f"   Content: {post_content[:50]}...")
+            print(f"   Content: {post['post_content'][:50]}...")
+
+            if platform == 'facebook':
+                facebook_posts.append(post)
+            else:
+                error_msg = f'Unsupported platform: {platform}'
+                print(f"   ❌ {error_msg}")
+                db.update_scheduled_post_status(
+                    post_id=post['id'],
+                    status='failed',
+                    error_message=error_msg
+                )
 
+        if facebook_posts:
+            # One Firefox for the whole batch, each post in its own context (no OAuth needed!)
             try:
-                # Publish based on platform
-                if platform == 'facebook':
-                    # Use Firefox session-based Facebook poster (no OAuth needed!)
-                    result = publish_to_facebook_sync(post_content, image_path)
-                else:
-                    error_msg = f'Unsupported platform: {platform}'
-                    print(f"   ❌ {error_msg}")
-                    db.update_scheduled_post_status(
-                        post_id=post_id,
-                        status='failed',
-                        error_message=error_msg
-                    )
-                    continue
+                results = publish_many_to_facebook_sync([{
+                    'post_content': post['post_content'],
+                    'image_path': post.get('image_path')
+                } for post in facebook_posts])
+            except Exception as e:
+                print(f"   ❌ Exception during publishing: {e}")
+                results = [{'success': False, 'message': str(e)}] * len(facebook_posts)
 
-                # Update status based on result
+            # Results come back in the order of the submitted posts
+            for post, result in zip(facebook_posts, results):
+                post_id = post['id']
                 if result.get('success'):
-                    print(f"   ✅ Published successfully!")
+                    print(f"   ✅ Post #{post_id} published successfully!")
                     print(f"   📸 Screenshot: {result.get('screenshot', 'N/A')}")
                     db.update_scheduled_post_status(
                         post_id=post_id,
@@ -205,80 +247,79 @@ def publish_scheduled_posts_job():
                     )
                 else:
                     error_msg = result.get('message', 'Unknown error')
-                    print(f"   ❌ Publishing failed: {error_msg}")
+                    print(f"   ❌ Post #{post_id} publishing failed: {error_msg}")
                     db.update_scheduled_post_status(
                         post_id=post_id,
                         status='failed',
                         error_message=error_msg
                     )
 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"   ❌ Exception during publishing: {error_msg}")
-                db.update_scheduled_post_status(
-                    post_id=post_id,
-                    status='failed',
-                    error_message=error_msg
-                )
-
         print(f"{'='*60}\n")
 
     except Exception as e:
         print(f"❌ Scheduled posts publishing error: {e}")
 
 
-# Schedule trend collection every 12 hours using CronTrigger (more reliable)
-# Runs at 00:00 and 12:00 every day
-scheduler.add_job(
-    func=collect_trends_job,
-    trigger=CronTrigger(hour='0,12', minute=0),
-    id='collect_trends_cron',
-    name='Collect trends at midnight and noon',
-    replace_existing=True
-)
-
-# ALSO add IntervalTrigger as backup (runs every 12 hours from start)
-scheduler.add_job(
-    func=collect_trends_job,
-    trigger=IntervalTrigger(hours=12),
-    id='collect_trends_interval',
-    name='Collect trends every 12 hours (interval)',
-    replace_existing=True
-)
-
-# Also run on startup
-scheduler.add_job(
-    func=collect_trends_job,
-    trigger='date',
-    run_date=datetime.now(),
-    id='initial_collection',
-    name='Initial trend collection'
-)
-
-# Schedule post publishing job - runs every minute to check for scheduled posts
-scheduler.add_job(
-    func=publish_scheduled_posts_job,
-    trigger=IntervalTrigger(minutes=1),
-    id='publish_scheduled_posts',
-    name='Publish scheduled posts every minute',
-    replace_existing=True
-)
-
-# Start scheduler
-scheduler.start()
-
-# Print scheduled jobs
-print("\n" + "="*60)
-print("✅ APScheduler started")
-print("="*60)
-print("Scheduled jobs:")
-for job in scheduler.get_jobs():
-    print(f"  • {job.name}")
-    print(f"    Next run: {job.next_run_time}")
-print("="*60 + "\n")
-
-# Shutdown scheduler on exit
-atexit.register(lambda: scheduler.shutdown())
+def start_scheduler():
+    """Register the background jobs and start APScheduler (serving process only)"""
+    # Schedule trend collection every 12 hours using CronTrigger (more reliable)
+    # Runs at 00:00 and 12:00 every day
+    scheduler.add_job(
+        func=collect_trends_job,
+        trigger=CronTrigger(hour='0,12', minute=0),
+        id='collect_trends_cron',
+        name='Collect trends at midnight and noon',
+        replace_existing=True
+    )
+
+    # ALSO add IntervalTrigger as backup (runs every 12 hours from start)
+    scheduler.add_job(
+        func=collect_trends_job,
+        trigger=IntervalTrigger(hours=12),
+        id='collect_trends_interval',
+        name='Collect trends every 12 hours (interval)',
+        replace_existing=True
+    )
+
+    # Also run on startup
+    scheduler.add_job(
+        func=collect_trends_job,
+        trigger='date',
+        run_date=datetime.now(),
+        id='initial_collection',
+        name='Initial trend collection'
+    )
+
+    # Schedule post publishing job - runs every minute to check for scheduled posts
+    scheduler.add_job(
+        func=publish_scheduled_posts_job,
+        trigger=IntervalTrigger(minutes=1),
+        id='publish_scheduled_posts',
+        name='Publish scheduled posts every minute',
+        replace_existing=True
+    )
+
+    # Start scheduler
+    scheduler.start()
+
+    # Print scheduled jobs
+    print("\n" + "="*60)
+    print("✅ APScheduler started")
+    print("="*60)
+    print("Scheduled jobs:")
+    for job in scheduler.get_jobs():
+        print(f"  • {job.name}")
+        print(f"    Next run: {job.next_run_time}")
+    print("="*60 + "\n")
+
+    # Shutdown scheduler on exit
+    atexit.register(lambda: scheduler.shutdown())
+
+
+# Spawned worker processes (document_parser PDF pool) re-import this file as
+# __mp_main__ - they must not run a second scheduler that publishes posts again
+if __name__ != '__mp_main__':
+    start_scheduler()
 
 
 # ============================================================================
@@ -431,7 +472,6 @@ def get_recent_posts():
     ''')
 
     rows = cursor.fetchall()
-    conn.close()
 
     posts = [dict(row) for row in rows]
 
@@ -455,7 +495,6 @@ def get_news():
     ''')
 
     rows = cursor.fetchall()
-    conn.close()
 
     news = [dict(row) for row in rows]
 
@@ -506,7 +545,6 @@ def generate_posts():
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM news_articles WHERE id = ?', (news_id,))
         news = cursor.fetchone()
-        conn.close()
 
         if not news:
             return jsonify({'error': 'News not found'}), 404
@@ -518,7 +556,6 @@ def generate_posts():
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM generated_posts WHERE trend_id = ?', (news_id,))
         existing = cursor.fetchall()
-        conn.close()
 
         if existing:
             return jsonify({
@@ -598,7 +635,6 @@ def delete_post(post_id):
         cursor.execute('DELETE FROM generated_posts WHERE id = ?', (post_id,))
         deleted = cursor.rowcount
         conn.commit()
-        conn.close()
 
         if deleted == 0:
             return jsonify({'error': 'Post not found'}), 404
@@ -654,8 +690,6 @@ def search():
     ''', (f'%{query}%', f'%{query}%', f'%{query}%'))
     news = [dict(row) for row in cursor.fetchall()]
 
-    conn.close()
-
     return jsonify({
         'query': query,
         'trends': trends,
@@ -1247,7 +1281,6 @@ def connection_status():
             cursor = conn.cursor()
             cursor.execute('SELECT profile_name FROM social_connections WHERE provider = ?', (provider,))
             row = cursor.fetchone()
-            conn.close()
 
             return jsonify({
                 'connected': True,
@@ -1279,7 +1312,6 @@ def disconnect():
         cursor.execute('DELETE FROM social_connections WHERE provider = ?', (provider,))
         deleted = cursor.rowcount
         conn.commit()
-        conn.close()
 
         if deleted > 0:
             return jsonify({
@@ -1347,7 +1379,7 @@ def schedule_post():
     except ValueError as e:
         return jsonify({'error': f'Invalid datetime format: {str(e)}'}), 400
     except Exception as e:
-        print(f"❌ Error scheduling post: {e}")
+        log.exception("❌ Error scheduling post")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1361,7 +1393,7 @@ def get_scheduled_posts():
             'posts': posts
         })
     except Exception as e:
-        print(f"❌ Error getting scheduled posts: {e}")
+        log.exception("❌ Error getting scheduled posts")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1381,102 +1413,25 @@ def delete_scheduled_post(post_id):
                 'message': 'Failed to delete post'
             }), 500
     except Exception as e:
-        print(f"❌ Error deleting scheduled post: {e}")
+        log.exception("❌ Error deleting scheduled post")
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/generate-from-url', methods=['POST'])
-def generate_from_url():
-    """
-    Generate social media post from article URL
-    POST body: {
-        "url": "https://example.com/article",
-        "language": "hu",  # hu, en, de, es, fr
-        "style": "facebook"  # facebook, linkedin, instagram, twitter, tiktok, reels, shorts
-    }
-    """
-    import requests
-    from bs4 import BeautifulSoup
-
-    data = request.get_json()
-
-    if not data:
-        return jsonify({'error': 'Request body is required'}), 400
-
-    url = data.get('url')
-    language = data.get('language', 'hu')
-    style = data.get('style', 'facebook')
-
-    if not url:
-        return jsonify({'error': 'url is required'}), 400
-
-    print(f"🔗 Generating post from URL: {url}")
-    print(f"   Language: {language}, Style: {style}")
-
-    try:
-        # Fetch article content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract title
-        title = ''
-        if soup.title:
-            title = soup.title.string or ''
-        og_title = soup.find('meta', property='og:title')
-        if og_title and og_title.get('content'):
-            title = og_title['content']
-
-        # Extract description
-        description = ''
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            description = meta_desc['content']
-        og_desc = soup.find('meta', property='og:description')
-        if og_desc and og_desc.get('content'):
-            description = og_desc['content']
-
-        # Extract article body text
-        article_text = ''
-
-        # Try to find article content
-        article = soup.find('article')
-        if article:
-            paragraphs = article.find_all('p')
-            article_text = ' '.join([p.get_text().strip() for p in paragraphs[:10]])
-        else:
-            # Fallback: get main content area
-            main = soup.find('main') or soup.find('div', class_='content') or soup.find('div', class_='post-content')
-            if main:
-                paragraphs = main.find_all('p')
-                article_text = ' '.join([p.get_text().strip() for p in paragraphs[:10]])
-            else:
-                # Last resort: get all paragraphs
-                paragraphs = soup.find_all('p')
-                article_text = ' '.join([p.get_text().strip() for p in paragraphs[:10]])
-
-        # Truncate to reasonable length
-        article_text = article_text[:2000] if article_text else description
-
-        if not title and not article_text:
-            return jsonify({'error': 'Could not extract content from URL'}), 400
-
-        # Build prompt based on style
-        language_names = {
-            'hu': 'magyar',
-            'en': 'English',
-            'de': 'Deutsch',
-            'es': 'Español',
-            'fr': 'Français'
-        }
+# ============================================================================
+# STYLE PROMPTS (URL / Doksiból Poszt)
+# ============================================================================
 
-        style_prompts = {
-            'facebook': f"""Írj egy figyelemfelkeltő Facebook posztot erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+LANGUAGE_NAMES = {
+    'hu': 'magyar',
+    'en': 'English',
+    'de': 'Deutsch',
+    'es': 'Español',
+    'fr': 'Français'
+}
+
+# {subject}: "erről a cikkről" / "ebből a dokumentumból", {lang}: LANGUAGE_NAMES value
+_RAW_STYLE_PROMPTS = {
+    'facebook': """Írj egy figyelemfelkeltő Facebook posztot {subject} {lang} nyelven.
 A poszt legyen:
 - Rövid (max 200 szó)
 - Tartalmazzon 2-3 emojit
@@ -1484,7 +1439,7 @@ A poszt legyen:
 - Tegyen fel egy gondolatébresztő kérdést a végén
 - Legyen informatív de szórakoztató hangvételű""",
 
-            'linkedin': f"""Írj egy professzionális LinkedIn posztot erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'linkedin': """Írj egy professzionális LinkedIn posztot {subject} {lang} nyelven.
 A poszt legyen:
 - Szakmai hangvételű
 - 150-250 szó
@@ -1492,21 +1447,21 @@ A poszt legyen:
 - Végezzen gondolatébresztő kérdéssel vagy call-to-action-nel
 - Releváns hashtagok a végén""",
 
-            'instagram': f"""Írj egy Instagram caption-t erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'instagram': """Írj egy Instagram caption-t {subject} {lang} nyelven.
 A caption legyen:
 - Rövid és ütős (max 150 szó)
 - Tartalmazzon 3-5 emojit
 - 5-10 releváns hashtag a végén
 - Vizuális leírás javaslat a képhez""",
 
-            'twitter': f"""Írj egy X/Twitter posztot erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'twitter': """Írj egy X/Twitter posztot {subject} {lang} nyelven.
 A poszt legyen:
 - Max 280 karakter
 - Ütős és figyelemfelkeltő
 - 1-2 hashtag
 - Legyen rövid és tömör""",
 
-            'tiktok': f"""Írj egy TikTok videó scriptet erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'tiktok': """Írj egy TikTok videó scriptet {subject} {lang} nyelven.
 A script legyen:
 - Hook az elején (első 3 másodperc)
 - 30-60 másodperces videóhoz
@@ -1514,7 +1469,7 @@ A script legyen:
 - Közvetlen megszólítás (Te/Ti)
 - CTA a végén (like, follow, comment)""",
 
-            'reels': f"""Írj egy Facebook/Instagram Reels videó scriptet erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'reels': """Írj egy Facebook/Instagram Reels videó scriptet {subject} {lang} nyelven.
 A script legyen:
 - Erős hook az elején
 - 15-30 másodperces videóhoz
@@ -1522,18 +1477,43 @@ A script legyen:
 - Szórakoztató és informatív
 - Emojikkal és dinamikával""",
 
-            'shorts': f"""Írj egy YouTube Shorts videó scriptet erről a cikkről {language_names.get(language, 'magyar')} nyelven.
+    'shorts': """Írj egy YouTube Shorts videó scriptet {subject} {lang} nyelven.
 A script legyen:
 - Figyelemfelkeltő nyitás
 - Max 60 másodperces videóhoz
 - Értékes tartalom gyorsan
 - Subscribe CTA a végén
 - Vizuális útmutatással"""
+}
+
+
+def _build_style_prompts(subject):
+    """Expand the raw templates into a PROMPTS[style][language] table"""
+    return {
+        style: {
+            lang: template.format(subject=subject, lang=name)
+            for lang, name in LANGUAGE_NAMES.items()
         }
+        for style, template in _RAW_STYLE_PROMPTS.items()
+    }
+
 
-        prompt = style_prompts.get(style, style_prompts['facebook'])
+# Built once at import - handlers only do two dict lookups
+URL_STYLE_PROMPTS = _build_style_prompts('erről a cikkről')
+DOC_STYLE_PROMPTS = _build_style_prompts('ebből a dokumentumból')
 
-        full_prompt = f"""{prompt}
+
+def get_style_prompt(prompts, style, language):
+    """Pick a prompt, falling back to facebook style and Hungarian language"""
+    by_language = prompts.get(style, prompts['facebook'])
+    return by_language.get(language, by_language['hu'])
+
+
+# Re-rendering the same article/document (e.g. for another platform) skips formatting
+@functools.lru_cache(maxsize=512)
+def build_url_prompt(style, language, title, article_text):
+    """Full generation prompt for an article fetched from a URL"""
+    return f"""{get_style_prompt(URL_STYLE_PROMPTS, style, language)}
 
 CIKK CÍME: {title}
 
@@ -1543,6 +1523,100 @@ CIKK TARTALMA:
 ---
 Generáld le a posztot/scriptet a fenti utasítások alapján:"""
 
+
+@functools.lru_cache(maxsize=512)
+def build_doc_prompt(style, language, document_text):
+    """Full generation prompt for an uploaded document"""
+    return f"""{get_style_prompt(DOC_STYLE_PROMPTS, style, language)}
+
+DOKUMENTUM TARTALMA:
+{document_text}
+
+---
+Generáld le a posztot/scriptet a fenti utasítások alapján:"""
+
+
+# (connect, read) timeouts and download cap for article fetching
+URL_FETCH_TIMEOUT = (3.0, 10.0)
+URL_FETCH_MAX_BYTES = 1_000_000
+
+
+@app.route('/api/generate-from-url', methods=['POST'])
+def generate_from_url():
+    """
+    Generate social media post from article URL
+    POST body: {
+        "url": "https://example.com/article",
+        "language": "hu",  # hu, en, de, es, fr
+        "style": "facebook"  # facebook, linkedin, instagram, twitter, tiktok, reels, shorts
+    }
+    """
+    import requests
+    from bs4 import BeautifulSoup
+
+    data = request.get_json()
+
+    if not data:
+        return jsonify({'error': 'Request body is required'}), 400
+
+    url = data.get('url')
+    language = data.get('language', 'hu')
+    style = data.get('style', 'facebook')
+
+    if not url:
+        return jsonify({'error': 'url is required'}), 400
+
+    print(f"🔗 Generating post from URL: {url}")
+    print(f"   Language: {language}, Style: {style}")
+
+    try:
+        # Fetch article content
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        }
+        with requests.get(url, headers=headers, timeout=URL_FETCH_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            # Read at most URL_FETCH_MAX_BYTES - huge pages can't exhaust worker memory
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= URL_FETCH_MAX_BYTES:
+                    break
+            html = b''.join(chunks)[:URL_FETCH_MAX_BYTES]
+
+        # Parse HTML (bytes, so BeautifulSoup detects the charset itself)
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Index <meta> tags in one pass (first non-empty value per key wins)
+        meta_by_key = {}
+        for meta in (soup.head or soup).find_all('meta'):
+            key = meta.get('property') or meta.get('name')
+            content = meta.get('content')
+            if key and content:
+                meta_by_key.setdefault(key, content)
+
+        # Extract title (og:title preferred)
+        title = meta_by_key.get('og:title') or (soup.title.string if soup.title else '') or ''
+
+        # Extract description (og:description preferred)
+        description = meta_by_key.get('og:description') or meta_by_key.get('description', '')
+
+        # Extract article body text: first content container in one query,
+        # last resort is every paragraph on the page
+        root = soup.select_one('article, main, div.content, div.post-content') or soup
+        paragraphs = root.find_all('p', limit=10)
+        article_text = ' '.join([p.get_text().strip() for p in paragraphs])
+
+        # Truncate to reasonable length
+        article_text = article_text[:2000] if article_text else description
+
+        if not title and not article_text:
+            return jsonify({'error': 'Could not extract content from URL'}), 400
+
+        full_prompt = build_url_prompt(style, language, title, article_text)
+
         print(f"   Generating with AI Provider: {AI_PROVIDER.upper()}")
 
         # Generate content using AI
@@ -1564,12 +1638,10 @@ Generáld le a posztot/scriptet a fenti utasítások alapján:"""
         })
 
     except requests.RequestException as e:
-        print(f"❌ Error fetching URL: {e}")
+        log.warning("❌ Error fetching URL: %s", e)
         return jsonify({'error': f'Could not fetch URL: {str(e)}'}), 400
     except Exception as e:
-        print(f"❌ Error generating from URL: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error generating from URL")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1604,45 +1676,11 @@ def upload_style():
         filename = file.filename.lower()
         ext = filename.rsplit('.', 1)[-1] if '.' in filename else ''
 
-        import tempfile
-        import os as os_module
-
-        temp_dir = tempfile.gettempdir()
-        temp_path = os_module.path.join(temp_dir, f"style_upload_{file.filename}")
-        file.save(temp_path)
+        if ext not in SUPPORTED_EXTENSIONS:
+            return jsonify({'error': f'Unsupported file type: {ext}'}), 400
 
         try:
-            if ext == 'txt':
-                with open(temp_path, 'r', encoding='utf-8') as f:
-                    text_content = f.read()
-
-            elif ext == 'md':
-                import markdown
-                from bs4 import BeautifulSoup
-                with open(temp_path, 'r', encoding='utf-8') as f:
-                    md_content = f.read()
-                html = markdown.markdown(md_content)
-                text_content = BeautifulSoup(html, 'html.parser').get_text()
-
-            elif ext == 'docx':
-                from docx import Document
-                doc = Document(temp_path)
-                paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-                text_content = '\n\n'.join(paragraphs)
-
-            elif ext == 'pdf':
-                import pdfplumber
-                with pdfplumber.open(temp_path) as pdf:
-                    pages_text = []
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        if text:
-                            pages_text.append(text)
-                    text_content = '\n\n'.join(pages_text)
-            else:
-                return jsonify({'error': f'Unsupported file type: {ext}'}), 400
-
-            os_module.remove(temp_path)
+            text_content = extract_document_text(file.stream, ext)
         except Exception as e:
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
@@ -1658,6 +1696,7 @@ def upload_style():
     try:
         rag_store = get_rag_store()
         chunks_added = rag_store.add_style_sample(text_content, source_name, style_name)
+        clear_rag_style_cache()
 
         return jsonify({
             'success': True,
@@ -1668,9 +1707,7 @@ def upload_style():
             'text_length': len(text_content)
         })
     except Exception as e:
-        print(f"❌ Error adding style sample: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error adding style sample")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1709,7 +1746,7 @@ def query_style():
             'results': results
         })
     except Exception as e:
-        print(f"❌ Error querying style: {e}")
+        log.exception("❌ Error querying style")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1745,7 +1782,7 @@ def get_style_context():
             'has_context': bool(context)
         })
     except Exception as e:
-        print(f"❌ Error getting style context: {e}")
+        log.exception("❌ Error getting style context")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1763,7 +1800,7 @@ def list_style_sources():
             'sources': sources
         })
     except Exception as e:
-        print(f"❌ Error listing sources: {e}")
+        log.exception("❌ Error listing sources")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1775,6 +1812,7 @@ def delete_style_source(source_name):
     try:
         rag_store = get_rag_store()
         deleted_count = rag_store.delete_source(source_name)
+        clear_rag_style_cache()
 
         return jsonify({
             'success': True,
@@ -1782,7 +1820,7 @@ def delete_style_source(source_name):
             'deleted_count': deleted_count
         })
     except Exception as e:
-        print(f"❌ Error deleting source: {e}")
+        log.exception("❌ Error deleting source")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1800,7 +1838,7 @@ def get_style_stats():
             'stats': stats
         })
     except Exception as e:
-        print(f"❌ Error getting stats: {e}")
+        log.exception("❌ Error getting stats")
         return jsonify({'error': str(e)}), 500
 
 
@@ -1808,6 +1846,10 @@ def get_style_stats():
 # DOCUMENT PARSING (Doksiból Poszt)
 # ============================================================================
 
+# Documents are summarized from their first 8000 chars, no need to extract more
+DOC_TEXT_LIMIT = 8000
+
+
 @app.route('/api/generate-from-doc', methods=['POST'])
 def generate_from_doc():
     """
@@ -1818,9 +1860,6 @@ def generate_from_doc():
         - language: hu, en, de, es, fr (default: hu)
         - style: facebook, linkedin, instagram, twitter, tiktok, reels, shorts (default: facebook)
     """
-    import tempfile
-    import os as os_module
-
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -1835,53 +1874,15 @@ def generate_from_doc():
     filename = file.filename.lower()
     ext = filename.rsplit('.', 1)[-1] if '.' in filename else ''
 
-    allowed_extensions = ['docx', 'pdf', 'md', 'txt']
-    if ext not in allowed_extensions:
-        return jsonify({'error': f'Unsupported file type. Allowed: {", ".join(allowed_extensions)}'}), 400
+    if ext not in SUPPORTED_EXTENSIONS:
+        return jsonify({'error': f'Unsupported file type. Allowed: {", ".join(SUPPORTED_EXTENSIONS)}'}), 400
 
     print(f"📄 Processing document: {file.filename}")
     print(f"   Extension: {ext}, Language: {language}, Style: {style}")
 
     try:
-        # Save file temporarily
-        temp_dir = tempfile.gettempdir()
-        temp_path = os_module.path.join(temp_dir, f"upload_{file.filename}")
-        file.save(temp_path)
-
-        # Extract text based on file type
-        extracted_text = ""
-
-        if ext == 'txt':
-            with open(temp_path, 'r', encoding='utf-8') as f:
-                extracted_text = f.read()
-
-        elif ext == 'md':
-            import markdown
-            with open(temp_path, 'r', encoding='utf-8') as f:
-                md_content = f.read()
-            # Convert markdown to plain text (strip HTML)
-            from bs4 import BeautifulSoup
-            html = markdown.markdown(md_content)
-            extracted_text = BeautifulSoup(html, 'html.parser').get_text()
-
-        elif ext == 'docx':
-            from docx import Document
-            doc = Document(temp_path)
-            paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-            extracted_text = '\n\n'.join(paragraphs)
-
-        elif ext == 'pdf':
-            import pdfplumber
-            with pdfplumber.open(temp_path) as pdf:
-                pages_text = []
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        pages_text.append(text)
-                extracted_text = '\n\n'.join(pages_text)
-
-        # Clean up temp file
-        os_module.remove(temp_path)
+        # Parse straight from the upload stream, every type capped at DOC_TEXT_LIMIT chars
+        extracted_text = extract_document_text(file.stream, ext, max_chars=DOC_TEXT_LIMIT)
 
         if not extracted_text.strip():
             return jsonify({'error': 'Could not extract text from document'}), 400
@@ -1889,8 +1890,8 @@ def generate_from_doc():
         # If document is too long, summarize it first (Railway 30s timeout)
         if len(extracted_text) > 5000:
             print(f"   📚 Document too long ({len(extracted_text)} chars), summarizing first...")
-            # Take first 8000 chars for summarization (more context, faster than full post gen)
-            text_for_summary = extracted_text[:8000] if len(extracted_text) > 8000 else extracted_text
+            # Take first DOC_TEXT_LIMIT chars for summarization (more context, faster than full post gen)
+            text_for_summary = extracted_text[:DOC_TEXT_LIMIT]
             summary_prompt = f"""Foglald össze az alábbi dokumentum LEGFONTOSABB pontjait maximum 1500 karakterben.
 Tartsd meg a kulcs információkat, számokat, neveket és főbb állításokat.
 
@@ -1949,80 +1950,7 @@ DOKUMENTUM:
             print(f"   ⚠️ Could not calculate SEO score: {e}")
             seo_score = 50  # Default score
 
-        # Build prompt based on style
-        language_names = {
-            'hu': 'magyar',
-            'en': 'English',
-            'de': 'Deutsch',
-            'es': 'Español',
-            'fr': 'Français'
-        }
-
-        style_prompts = {
-            'facebook': f"""Írj egy figyelemfelkeltő Facebook posztot ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A poszt legyen:
-- Rövid (max 200 szó)
-- Tartalmazzon 2-3 emojit
-- Tartalmazzon 1-3 releváns hashtagot
-- Tegyen fel egy gondolatébresztő kérdést a végén
-- Legyen informatív de szórakoztató hangvételű""",
-
-            'linkedin': f"""Írj egy professzionális LinkedIn posztot ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A poszt legyen:
-- Szakmai hangvételű
-- 150-250 szó
-- Tartalmazzon kulcsfontosságú tanulságokat (bullet points)
-- Végezzen gondolatébresztő kérdéssel vagy call-to-action-nel
-- Releváns hashtagok a végén""",
-
-            'instagram': f"""Írj egy Instagram caption-t ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A caption legyen:
-- Rövid és ütős (max 150 szó)
-- Tartalmazzon 3-5 emojit
-- 5-10 releváns hashtag a végén
-- Vizuális leírás javaslat a képhez""",
-
-            'twitter': f"""Írj egy X/Twitter posztot ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A poszt legyen:
-- Max 280 karakter
-- Ütős és figyelemfelkeltő
-- 1-2 hashtag
-- Legyen rövid és tömör""",
-
-            'tiktok': f"""Írj egy TikTok videó scriptet ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A script legyen:
-- Hook az elején (első 3 másodperc)
-- 30-60 másodperces videóhoz
-- Dinamikus, gyors tempójú
-- Közvetlen megszólítás (Te/Ti)
-- CTA a végén (like, follow, comment)""",
-
-            'reels': f"""Írj egy Facebook/Instagram Reels videó scriptet ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A script legyen:
-- Erős hook az elején
-- 15-30 másodperces videóhoz
-- Vizuális tippekkel (mit mutassunk)
-- Szórakoztató és informatív
-- Emojikkal és dinamikával""",
-
-            'shorts': f"""Írj egy YouTube Shorts videó scriptet ebből a dokumentumból {language_names.get(language, 'magyar')} nyelven.
-A script legyen:
-- Figyelemfelkeltő nyitás
-- Max 60 másodperces videóhoz
-- Értékes tartalom gyorsan
-- Subscribe CTA a végén
-- Vizuális útmutatással"""
-        }
-
-        prompt = style_prompts.get(style, style_prompts['facebook'])
-
-        full_prompt = f"""{prompt}
-
-DOKUMENTUM TARTALMA:
-{extracted_text}
-
----
-Generáld le a posztot/scriptet a fenti utasítások alapján:"""
+        full_prompt = build_doc_prompt(style, language, extracted_text)
 
         print(f"   🤖 Generating with AI Provider: {AI_PROVIDER.upper()}")
 
@@ -2046,9 +1974,7 @@ Generáld le a posztot/scriptet a fenti utasítások alapján:"""
         })
 
     except Exception as e:
-        print(f"❌ Error processing document: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error processing document")
         return jsonify({'error': str(e)}), 500
 
 
@@ -0,0 +1,79 @@
+"""
+Async helpers for TrendMaster
+A persistent background event loop for the sync (Flask, APScheduler) callers
+and a token-bucket rate limiter for the async API clients running on it
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+
+class LoopThread:
+    """Event loop on a daemon thread that outlives single calls (async clients bind to one loop)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def run(self, coro):
+        """Run coro on the background loop and block until it finishes"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name=self.name, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+class RateLimiter:
+    """
+    Token bucket over requests/min and, optionally, tokens/min.
+
+    Callers wait here until the request fits under every limit, so a
+    concurrent batch runs close to the limit instead of into 429 retries.
+    Bursts up to a full minute's budget. Use it from one event loop only.
+    """
+
+    def __init__(self, rpm: int, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait for one request slot and `tokens` worth of TPM capacity"""
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        async with self._lock:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+
+                wait = (1 - self._requests) * 60 / self.rpm
+                if tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller back after a 429 (Retry-After)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -2,19 +2,67 @@
 Trend Collector for TrendMaster
 Collects trending topics from Google Trends and YouTube
 """
-from pytrends.request import TrendReq
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterator, List
 import os
+import threading
 import time
 
+YOUTUBE_REGIONS = ['HU', 'GB', 'US']
+
+# Client-side cap on videos.list calls (each batched sub-request counts as one)
+YOUTUBE_MAX_CALLS = 30
+YOUTUBE_CALL_WINDOW = 60.0  # seconds
+
+
+@dataclass(slots=True)
+class Trend:
+    """One collected trend - field order matches the trends table columns"""
+    source: str
+    topic: str
+    rank: int = 0
+    relevance_score: float = 0.0
+    metadata: str = ''
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter: at most max_calls per window seconds.
+    acquire() returns immediately while under the limit and only sleeps
+    until the oldest call leaves the window when it is full. Thread-safe.
+    """
+
+    def __init__(self, max_calls: int, window: float):
+        self.max_calls = max_calls
+        self.window = window
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, count: int = 1):
+        """Block until count more calls fit in the window, then record them"""
+        with self._lock:
+            for _ in range(count):
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window:
+                    self._calls.popleft()
+                if len(self._calls) >= self.max_calls:
+                    time.sleep(self.window - (now - self._calls[0]))
+                    self._calls.popleft()
+                self._calls.append(time.monotonic())
+
 
 class TrendCollector:
     def __init__(self):
         """Initialize trend collector with API keys"""
         self.youtube_api_key = os.getenv('YOUTUBE_API_KEY')
         self.youtube = None
+        self._yt_limiter = RateLimiter(YOUTUBE_MAX_CALLS, YOUTUBE_CALL_WINDOW)
 
         if self.youtube_api_key:
             try:
@@ -23,15 +71,7 @@ class TrendCollector:
             except Exception as e:
                 print(f"⚠️ YouTube API initialization failed: {e}")
 
-        # Initialize pytrends
-        try:
-            self.pytrends = TrendReq(hl='en-US', tz=360)
-            print("✅ PyTrends initialized")
-        except Exception as e:
-            print(f"⚠️ PyTrends initialization failed: {e}")
-            self.pytrends = None
-
-    def collect_google_trends(self, country_code: str = 'HU') -> List[Dict]:
+    def collect_google_trends(self, country_code: str = 'HU') -> List[Trend]:
         """
         Collect Google Trends for specified country
         NOTE: PyTrends API deprecated, using Google News RSS instead
@@ -40,7 +80,47 @@ class TrendCollector:
         print(f"ℹ️ Google Trends collection moved to Google News RSS (see news_collector.py)")
         return []
 
-    def collect_youtube_trending(self, region_code: str = 'HU') -> List[Dict]:
+    def _youtube_chart_request(self, region_code: str):
+        """Build the mostPopular chart request for a region"""
+        return self.youtube.videos().list(
+            part='snippet,statistics',
+            chart='mostPopular',
+            regionCode=region_code,
+            maxResults=10
+        )
+
+    def _parse_youtube_items(self, region_code: str, items: List[Dict]) -> List[Trend]:
+        """Turn a videos.list response into Trends"""
+        source_name = f'youtube_{region_code.lower()}'
+
+        def stat_array(key: str) -> np.ndarray:
+            return np.fromiter(
+                (int(item['statistics'].get(key, 0)) for item in items),
+                dtype=np.int64, count=len(items)
+            )
+
+        view_counts = stat_array('viewCount')
+        like_counts = stat_array('likeCount')
+        comment_counts = stat_array('commentCount')
+
+        # Simple engagement score, computed for the whole response at once
+        engagement_scores = (like_counts + comment_counts) / np.maximum(view_counts, 1) * 10000.0
+
+        trends = []
+        for rank, (item, views, likes, score) in enumerate(
+                zip(items, view_counts.tolist(), like_counts.tolist(), engagement_scores.tolist()), 1):
+            snippet = item['snippet']
+            trends.append(Trend(
+                source=source_name,
+                topic=snippet['title'],
+                rank=rank,
+                relevance_score=score,
+                metadata=f'Views: {views:,} | Likes: {likes:,} | Channel: {snippet["channelTitle"]}'
+            ))
+
+        return trends
+
+    def collect_youtube_trending(self, region_code: str = 'HU') -> List[Trend]:
         """
         Collect YouTube trending videos
         region_code: HU, US, GB
@@ -50,91 +130,104 @@ class TrendCollector:
             return []
 
         trends = []
-        source_name = f'youtube_{region_code.lower()}'
 
         try:
             print(f"📡 Fetching YouTube Trending for {region_code}...")
 
-            # Get trending videos
-            request = self.youtube.videos().list(
-                part='snippet,statistics',
-                chart='mostPopular',
-                regionCode=region_code,
-                maxResults=10
-            )
-            response = request.execute()
-
-            for rank, item in enumerate(response.get('items', []), 1):
-                snippet = item['snippet']
-                stats = item['statistics']
-
-                # Extract topic from title
-                topic = snippet['title']
-
-                # Calculate relevance score based on views and engagement
-                view_count = int(stats.get('viewCount', 0))
-                like_count = int(stats.get('likeCount', 0))
-                comment_count = int(stats.get('commentCount', 0))
-
-                # Simple engagement score
-                engagement_score = (like_count + comment_count) / max(view_count, 1) * 10000
-
-                trends.append({
-                    'source': source_name,
-                    'topic': topic,
-                    'rank': rank,
-                    'relevance_score': engagement_score,
-                    'metadata': f'Views: {view_count:,} | Likes: {like_count:,} | Channel: {snippet["channelTitle"]}'
-                })
+            self._yt_limiter.acquire()
+            # httplib2 is not thread-safe - every call gets its own connection
+            response = self._youtube_chart_request(region_code).execute(http=build_http())
+            trends = self._parse_youtube_items(region_code, response.get('items', []))
 
             print(f"✅ Collected {len(trends)} YouTube trends from {region_code}")
-            time.sleep(1)  # Rate limiting
 
         except Exception as e:
             print(f"❌ Error collecting YouTube trends for {region_code}: {e}")
 
         return trends
 
-    def collect_all_trends(self) -> Dict[str, List[Dict]]:
+    def collect_youtube_trending_batch(self, regions: List[str]) -> Dict[str, List[Trend]]:
         """
-        Collect all trends from all sources
-        Returns dictionary with source as key
+        Collect YouTube trending videos for several regions in one batched
+        HTTP round trip. Regions whose sub-request failed are left out.
+        """
+        if not self.youtube:
+            print(f"⚠️ YouTube API not available for {', '.join(regions)}")
+            return {}
+
+        responses = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                print(f"⚠️ YouTube batch request failed for {request_id}: {exception}")
+            else:
+                responses[request_id] = response
+
+        print(f"📡 Fetching YouTube Trending for {', '.join(regions)} (batched)...")
+        batch = self.youtube.new_batch_http_request(callback=on_response)
+        for region in regions:
+            batch.add(self._youtube_chart_request(region), request_id=region)
+        self._yt_limiter.acquire(len(regions))
+        batch.execute()
+
+        results = {}
+        for region, response in responses.items():
+            results[region] = self._parse_youtube_items(region, response.get('items', []))
+            print(f"✅ Collected {len(results[region])} YouTube trends from {region}")
+        return results
+
+    def _iter_all_trends(self) -> Iterator[Trend]:
+        """
+        Yield trends from all sources as each source's results arrive
+        Every trend carries its source key (e.g. youtube_hu) in .source
         """
         print(f"\n{'='*60}")
         print(f"🔥 TRENDMASTER - TREND COLLECTION STARTED")
         print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}\n")
 
-        all_trends = {}
+        total_trends = 0
 
-        # Google Trends - HU, UK, US
-        for country in ['HU', 'GB', 'US']:
-            try:
-                trends = self.collect_google_trends(country)
-                if trends:
-                    all_trends[f'google_{country.lower()}'] = trends
-            except Exception as e:
-                print(f"❌ Failed to collect Google Trends for {country}: {e}")
+        # Google Trends come from Google News RSS now (news_collector.py)
 
-        # YouTube Trending - HU, GB, US
-        for region in ['HU', 'GB', 'US']:
-            try:
-                trends = self.collect_youtube_trending(region)
-                if trends:
-                    all_trends[f'youtube_{region.lower()}'] = trends
-            except Exception as e:
-                print(f"❌ Failed to collect YouTube trends for {region}: {e}")
+        # YouTube Trending - HU, GB, US: one batched round trip first
+        youtube_trends = {}
+        try:
+            youtube_trends = self.collect_youtube_trending_batch(YOUTUBE_REGIONS)
+        except Exception as e:
+            print(f"⚠️ YouTube batch request failed, falling back to per-region calls: {e}")
+
+        for trends in youtube_trends.values():
+            total_trends += len(trends)
+            yield from trends
+
+        # Anything the batch missed is fetched with independent concurrent requests
+        missing = [region for region in YOUTUBE_REGIONS if region not in youtube_trends]
+        if missing and self.youtube:
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                futures = [executor.submit(self.collect_youtube_trending, region) for region in missing]
+                for future in as_completed(futures):
+                    try:
+                        trends = future.result()
+                    except Exception as e:
+                        print(f"❌ Failed to collect YouTube trends: {e}")
+                        continue
+                    total_trends += len(trends)
+                    yield from trends
 
-        total_trends = sum(len(trends) for trends in all_trends.values())
         print(f"\n✅ Collection complete! Total trends: {total_trends}")
         print(f"{'='*60}\n")
 
+    def collect_all_trends(self) -> Dict[str, List[Trend]]:
+        """
+        Collect all trends from all sources
+        Returns dictionary with source as key
+        """
+        all_trends = {}
+        for trend in self._iter_all_trends():
+            all_trends.setdefault(trend.source, []).append(trend)
         return all_trends
 
-    def get_flat_trends_list(self) -> List[Dict]:
+    def get_flat_trends_list(self) -> List[Trend]:
         """Get all trends as flat list"""
-        all_trends = self.collect_all_trends()
-        flat_list = []
-        for trends in all_trends.values():
-            flat_list.extend(trends)
-        return flat_list
+        return list(self._iter_all_trends())
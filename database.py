@@ -3,44 +3,206 @@ SQLite Database Manager for TrendMaster
 Handles trends and generated posts storage
 """
 import sqlite3
+import threading
+from dataclasses import astuple
 from datetime import datetime
 from typing import List, Dict, Optional
 import os
 
+# Per-connection tuning; journal_mode=WAL is persistent and only set in init_db
+CONNECTION_PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -65536;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA busy_timeout = 5000;
+    PRAGMA secure_delete = OFF;
+"""
+
+# Rows per multi-row INSERT (8 columns * 100 stays under the 999 variable limit)
+MULTI_INSERT_CHUNK = 100
+
+# Pages handed back to the OS per cleanup run (auto_vacuum = INCREMENTAL)
+INCREMENTAL_VACUUM_PAGES = 1000
+
+# Per-connection prepared statement cache size (sqlite3 default is 128)
+CACHED_STATEMENTS = 256
+
+# Hot write statements, shared so every call hits the same cached prepared statement
+_SQL_INSERT_TREND = '''
+    INSERT OR IGNORE INTO trends (source, topic, rank, relevance_score, metadata)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_SQL_SAVE_POST = '''
+    INSERT INTO generated_posts (trend_id, post_text, char_count)
+    VALUES (?, ?, ?)
+    RETURNING *
+'''
+
+# fetch_time is stored as INTEGER unix epoch seconds: 8-byte integer sort keys
+# instead of 19-byte ISO text in the fetch_time indexes
+EPOCH_NOW = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+_TRENDS_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {{table}} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        rank INTEGER,
+        fetch_time INTEGER DEFAULT ({EPOCH_NOW}),
+        relevance_score REAL DEFAULT 0.0,
+        metadata TEXT,
+        UNIQUE(source, topic, fetch_time)
+    )
+'''
+
+_NEWS_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {{table}} (
+        id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        link TEXT,
+        pub_date TIMESTAMP,
+        category TEXT,
+        fetch_time INTEGER DEFAULT ({EPOCH_NOW}),
+        relevance_score REAL DEFAULT 0.0
+    )
+'''
+
+# Re-fetched articles are updated in place (INSERT OR REPLACE would delete + re-insert);
+# fetch_time is bumped like the old REPLACE did so they stay at the top of the news feed
+_NEWS_COLUMNS = ['id', 'source', 'title', 'description', 'link', 'pub_date', 'category', 'relevance_score']
+_NEWS_UPSERT = f'''
+    ON CONFLICT(id) DO UPDATE SET
+        source = excluded.source,
+        title = excluded.title,
+        description = excluded.description,
+        link = excluded.link,
+        pub_date = excluded.pub_date,
+        category = excluded.category,
+        relevance_score = excluded.relevance_score,
+        fetch_time = {EPOCH_NOW}
+'''
+
+_SQL_SAVE_NEWS = '''
+    INSERT INTO news_articles
+    (id, source, title, description, link, pub_date, category, relevance_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+''' + _NEWS_UPSERT
+
+_SQL_UPDATE_SCHEDULED_STATUS = '''
+    UPDATE scheduled_posts
+    SET status = ?, published_at = ?, error_message = ?
+    WHERE id = ?
+'''
+
+
+def _trend_row(trend) -> tuple:
+    """(source, topic, rank, relevance_score, metadata) from a collector Trend or a plain dict"""
+    if isinstance(trend, dict):
+        return (
+            trend.get('source'),
+            trend.get('topic'),
+            trend.get('rank', 0),
+            trend.get('relevance_score', 0.0),
+            trend.get('metadata', '')
+        )
+    return astuple(trend)
+
 
 class Database:
     def __init__(self, db_path='trending_hub.db'):
         """Initialize database connection"""
         self.db_path = db_path
+        self._local = threading.local()
         self.init_db()
 
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """
+        Get this thread's database connection.
+        Opened (and tuned) once per thread, then reused - callers must not close it.
+        Autocommit mode: multi-statement writes open their own BEGIN.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(CONNECTION_PRAGMAS)
+            self._local.conn = conn
         return conn
 
+    def close(self):
+        """Close this thread's connection (shutdown)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _multi_insert(self, cursor, verb: str, table: str, columns: List[str],
+                      rows: List[tuple], chunk_size: int = MULTI_INSERT_CHUNK, suffix: str = '') -> int:
+        """
+        Insert rows using multi-row VALUES statements (chunk_size rows each).
+        suffix is appended to every statement (e.g. an ON CONFLICT clause).
+        Runs in the caller's transaction, returns the number of rows changed.
+        """
+        placeholders = '(' + ', '.join('?' * len(columns)) + ')'
+        changed = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            sql = (f"{verb} INTO {table} ({', '.join(columns)}) VALUES "
+                   + ', '.join([placeholders] * len(chunk)) + suffix)
+            cursor.execute(sql, [value for row in chunk for value in row])
+            changed += cursor.rowcount
+        return changed
+
+    def _migrate_epoch_fetch_time(self, conn):
+        """
+        One-off migration for files created while fetch_time was ISO text:
+        rebuild trends/news_articles with the INTEGER column and convert the values.
+        """
+        for table, ddl in (('trends', _TRENDS_TABLE), ('news_articles', _NEWS_TABLE)):
+            columns = {row['name']: row['type'] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if columns.get('fetch_time', 'INTEGER') == 'INTEGER':
+                continue
+
+            names = ', '.join(columns)
+            values = ', '.join(
+                "CAST(strftime('%s', fetch_time) AS INTEGER)" if name == 'fetch_time' else name
+                for name in columns
+            )
+            conn.executescript(f'''
+                BEGIN;
+                {ddl.format(table=f'{table}_new')};
+                INSERT INTO {table}_new ({names}) SELECT {values} FROM {table};
+                DROP TABLE {table};
+                ALTER TABLE {table}_new RENAME TO {table};
+                COMMIT;
+            ''')
+            print(f"✅ Migrated {table}.fetch_time to unix epoch")
+
     def init_db(self):
         """Initialize database tables"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        self._migrate_epoch_fetch_time(conn)
 
-        # Trends table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trends (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source TEXT NOT NULL,
-                topic TEXT NOT NULL,
-                rank INTEGER,
-                fetch_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                relevance_score REAL DEFAULT 0.0,
-                metadata TEXT,
-                UNIQUE(source, topic, fetch_time)
-            )
-        ''')
+        # All tables and indexes in one script; the pragmas must run outside the transaction
+        conn.executescript(f'''
+            -- Only takes effect on a fresh database (before the first table is created);
+            -- an existing file keeps auto_vacuum = NONE until a one-off manual VACUUM
+            PRAGMA auto_vacuum = INCREMENTAL;
 
-        # Generated posts table
-        cursor.execute('''
+            -- WAL: readers don't block the writer, commits append instead of fsyncing pages
+            PRAGMA journal_mode = WAL;
+
+            BEGIN;
+
+            -- Trends table
+            {_TRENDS_TABLE.format(table='trends')};
+
+            -- Generated posts table
             CREATE TABLE IF NOT EXISTS generated_posts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 trend_id INTEGER,
@@ -48,36 +210,20 @@ class Database:
                 char_count INTEGER,
                 generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (trend_id) REFERENCES trends(id) ON DELETE CASCADE
-            )
-        ''')
+            );
 
-        # News articles table (for RSS integration)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS news_articles (
-                id TEXT PRIMARY KEY,
-                source TEXT NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                link TEXT,
-                pub_date TIMESTAMP,
-                category TEXT,
-                fetch_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                relevance_score REAL DEFAULT 0.0
-            )
-        ''')
+            -- News articles table (for RSS integration)
+            {_NEWS_TABLE.format(table='news_articles')};
 
-        # Social connections table (for Nango integration)
-        cursor.execute('''
+            -- Social connections table (for Nango integration)
             CREATE TABLE IF NOT EXISTS social_connections (
                 provider TEXT PRIMARY KEY,
                 connection_id TEXT NOT NULL,
                 profile_name TEXT,
                 connected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            );
 
-        # Scheduled posts table (for time-based publishing)
-        cursor.execute('''
+            -- Scheduled posts table (for time-based publishing)
             CREATE TABLE IF NOT EXISTS scheduled_posts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 post_content TEXT NOT NULL,
@@ -89,38 +235,57 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 published_at TIMESTAMP,
                 error_message TEXT
-            )
+            );
+
+            -- Indexes for the hot read paths (latest-by-source, latest news, scheduler poll)
+            CREATE INDEX IF NOT EXISTS idx_trends_source_time ON trends(source, fetch_time DESC, rank);
+            CREATE INDEX IF NOT EXISTS idx_trends_fetchtime ON trends(fetch_time DESC);
+            CREATE INDEX IF NOT EXISTS idx_news_fetchtime ON news_articles(fetch_time DESC);
+            -- Partial index: only pending posts are polled, published/failed history stays out of it
+            DROP INDEX IF EXISTS idx_scheduled_status_time;
+            CREATE INDEX IF NOT EXISTS idx_scheduled_pending ON scheduled_posts(scheduled_time) WHERE status = 'pending';
+            CREATE INDEX IF NOT EXISTS idx_posts_trend ON generated_posts(trend_id, generated_at DESC);
+
+            COMMIT;
         ''')
 
-        conn.commit()
-        conn.close()
         print("✅ SQLite database initialized")
 
-    def save_trends(self, trends: List[Dict]) -> int:
-        """Save trends to database"""
+    def save_trends(self, trends: List) -> int:
+        """Save trends (collector.Trend or dict) to database in one transaction"""
+        rows = [_trend_row(trend) for trend in trends]
+        if not rows:
+            return 0
+
         conn = self.get_connection()
         cursor = conn.cursor()
         saved = 0
 
-        for trend in trends:
-            try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO trends (source, topic, rank, relevance_score, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    trend.get('source'),
-                    trend.get('topic'),
-                    trend.get('rank', 0),
-                    trend.get('relevance_score', 0.0),
-                    trend.get('metadata', '')
-                ))
-                if cursor.rowcount > 0:
-                    saved += 1
-            except sqlite3.Error as e:
-                print(f"❌ Error saving trend: {e}")
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            saved = self._multi_insert(
+                cursor, 'INSERT OR IGNORE', 'trends',
+                ['source', 'topic', 'rank', 'relevance_score', 'metadata'], rows
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            # One bad row aborts the batch - retry row by row so the rest still lands
+            print(f"⚠️ Batch trend insert failed ({e}), retrying row by row")
+            conn.rollback()
+            errors = []
+            for row in rows:
+                try:
+                    cursor.execute(_SQL_INSERT_TREND, row)
+                    if cursor.rowcount > 0:
+                        saved += 1
+                except sqlite3.Error as e:
+                    errors.append((row[1], str(e)))
+            conn.commit()
+            if errors:
+                details = '; '.join(f"{topic}: {error}" for topic, error in errors[:5])
+                more = f" (+{len(errors) - 5} more)" if len(errors) > 5 else ''
+                print(f"❌ Error saving {len(errors)} trends: {details}{more}")
 
-        conn.commit()
-        conn.close()
         return saved
 
     def get_latest_trends(self, source: Optional[str] = None, limit: int = 10) -> List[Dict]:
@@ -143,7 +308,6 @@ class Database:
             ''', (limit,))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [dict(row) for row in rows]
 
@@ -154,26 +318,19 @@ class Database:
 
         cursor.execute('SELECT * FROM trends WHERE id = ?', (trend_id,))
         row = cursor.fetchone()
-        conn.close()
 
         return dict(row) if row else None
 
-    def save_generated_post(self, trend_id: int, post_text: str) -> int:
-        """Save generated post"""
+    def save_generated_post(self, trend_id: int, post_text: str) -> Dict:
+        """Save generated post, returns the stored row (id, generated_at, ...)"""
         conn = self.get_connection()
         cursor = conn.cursor()
 
         char_count = len(post_text)
-        cursor.execute('''
-            INSERT INTO generated_posts (trend_id, post_text, char_count)
-            VALUES (?, ?, ?)
-        ''', (trend_id, post_text, char_count))
-
-        post_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # fetchall() steps the statement to completion so the autocommit write is finalized
+        row = cursor.execute(_SQL_SAVE_POST, (trend_id, post_text, char_count)).fetchall()[0]
 
-        return post_id
+        return dict(row)
 
     def get_posts_for_trend(self, trend_id: int) -> List[Dict]:
         """Get all generated posts for a trend"""
@@ -187,7 +344,6 @@ class Database:
         ''', (trend_id,))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [dict(row) for row in rows]
 
@@ -197,11 +353,7 @@ class Database:
         cursor = conn.cursor()
 
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO news_articles
-                (id, source, title, description, link, pub_date, category, relevance_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            cursor.execute(_SQL_SAVE_NEWS, (
                 article.get('id'),
                 article.get('source'),
                 article.get('title'),
@@ -212,13 +364,42 @@ class Database:
                 article.get('relevance_score', 0.0)
             ))
             conn.commit()
-            conn.close()
             return True
         except sqlite3.Error as e:
             print(f"❌ Error saving news article: {e}")
-            conn.close()
             return False
 
+    def save_news_articles(self, articles: List[Dict]) -> int:
+        """Save a batch of news articles in a single transaction"""
+        rows = [
+            (
+                article.get('id'),
+                article.get('source'),
+                article.get('title'),
+                article.get('description'),
+                article.get('link'),
+                article.get('pub_date'),
+                article.get('category'),
+                article.get('relevance_score', 0.0)
+            )
+            for article in articles
+        ]
+        if not rows:
+            return 0
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            self._multi_insert(cursor, 'INSERT', 'news_articles', _NEWS_COLUMNS, rows, suffix=_NEWS_UPSERT)
+            conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"❌ Error saving news articles: {e}")
+            conn.rollback()
+            return 0
+
     def get_latest_news(self, limit: int = 20) -> List[Dict]:
         """Get latest news articles"""
         conn = self.get_connection()
@@ -231,7 +412,6 @@ class Database:
         ''', (limit,))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [dict(row) for row in rows]
 
@@ -242,12 +422,16 @@ class Database:
 
         cursor.execute('''
             DELETE FROM trends
-            WHERE fetch_time < datetime('now', '-' || ? || ' days')
+            WHERE fetch_time < CAST(strftime('%s', 'now', '-' || ? || ' days') AS INTEGER)
         ''', (days,))
 
         deleted = cursor.rowcount
         conn.commit()
-        conn.close()
+
+        # Return the freed pages to the OS (no-op unless auto_vacuum is INCREMENTAL).
+        # executescript steps the pragma to completion; execute() frees only one page.
+        if deleted:
+            conn.executescript(f'PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES});')
 
         return deleted
 
@@ -256,19 +440,15 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
 
-        cursor.execute('SELECT COUNT(*) FROM trends')
-        total_trends = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM generated_posts')
-        total_posts = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM news_articles')
-        total_news = cursor.fetchone()[0]
-
-        cursor.execute('SELECT MAX(fetch_time) FROM trends')
-        last_fetch = cursor.fetchone()[0]
-
-        conn.close()
+        # One statement: parsed/planned once per dashboard poll
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM trends),
+                (SELECT COUNT(*) FROM generated_posts),
+                (SELECT COUNT(*) FROM news_articles),
+                (SELECT datetime(MAX(fetch_time), 'unixepoch') FROM trends)
+        ''')
+        total_trends, total_posts, total_news, last_fetch = cursor.fetchone()
 
         return {
             'total_trends': total_trends,
@@ -288,12 +468,10 @@ class Database:
                 VALUES (?, ?, ?)
             ''', (provider, connection_id, profile_name))
             conn.commit()
-            conn.close()
             print(f"✅ Saved connection for {provider}")
             return True
         except sqlite3.Error as e:
             print(f"❌ Error saving connection: {e}")
-            conn.close()
             return False
 
     def get_connection_id(self, provider: str) -> Optional[str]:
@@ -303,7 +481,6 @@ class Database:
 
         cursor.execute('SELECT connection_id FROM social_connections WHERE provider = ?', (provider,))
         row = cursor.fetchone()
-        conn.close()
 
         return row['connection_id'] if row else None
 
@@ -321,7 +498,6 @@ class Database:
 
         post_id = cursor.lastrowid
         conn.commit()
-        conn.close()
 
         return post_id
 
@@ -340,7 +516,6 @@ class Database:
         ''', (current_time,))
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [dict(row) for row in rows]
 
@@ -355,7 +530,6 @@ class Database:
         ''')
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [dict(row) for row in rows]
 
@@ -367,18 +541,12 @@ class Database:
         cursor = conn.cursor()
 
         try:
-            cursor.execute('''
-                UPDATE scheduled_posts
-                SET status = ?, published_at = ?, error_message = ?
-                WHERE id = ?
-            ''', (status, published_at, error_message, post_id))
+            cursor.execute(_SQL_UPDATE_SCHEDULED_STATUS, (status, published_at, error_message, post_id))
 
             conn.commit()
-            conn.close()
             return True
         except sqlite3.Error as e:
             print(f"❌ Error updating scheduled post: {e}")
-            conn.close()
             return False
 
     def delete_scheduled_post(self, post_id: int) -> bool:
@@ -389,11 +557,9 @@ class Database:
         try:
             cursor.execute('DELETE FROM scheduled_posts WHERE id = ?', (post_id,))
             conn.commit()
-            conn.close()
             return True
         except sqlite3.Error as e:
             print(f"❌ Error deleting scheduled post: {e}")
-            conn.close()
             return False
 
 
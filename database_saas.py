@@ -4,13 +4,120 @@ Multi-tenant támogatás, Agent kezelés, Task rendszer
 
 Ez a modul kiegészíti a meglévő database.py-t a SaaS funkciókkal.
 """
+import atexit
+import functools
+import queue
 import sqlite3
+import orjson
 import secrets
+import threading
 import hashlib
-from datetime import datetime, timedelta
+import hmac
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import List, Dict, Optional, Any
 from enum import Enum
 
+# Kapcsolatonkénti beállítások; a journal_mode=WAL perzisztens, az init_saas_tables állítja be
+CONNECTION_PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA cache_size = -65536;
+    PRAGMA wal_autocheckpoint = 1000;
+    PRAGMA busy_timeout = 5000;
+"""
+
+# Kapcsolatonkénti prepared statement cache (sqlite3 alapértelmezés: 128)
+CACHED_STATEMENTS = 256
+
+# Forró olvasási útvonalak - modul szintű SQL, hogy minden hívás ugyanazt a cache-elt statementet érje.
+# Auth: csak az request.current_user-hez kellő oszlopok (a password_hash nem kerül a cache-be)
+SQL_GET_USER_BY_KEY = '''
+    SELECT id, email, name, plan, api_key, last_login
+    FROM users WHERE api_key = ? AND is_active = 1
+'''
+# Agent ownership/heartbeat ellenőrzésekhez (hwid_hash nélkül)
+SQL_GET_AGENT = '''
+    SELECT id, user_id, name, version, status, last_heartbeat, capabilities
+    FROM agents WHERE id = ?
+'''
+SQL_GET_TASK = 'SELECT * FROM tasks WHERE id = ?'
+SQL_GET_AGENT_PLATFORMS = '''
+    SELECT * FROM platform_accounts
+    WHERE agent_id = ? AND is_active = 1
+'''
+# A legutóbbi `limit` bejegyzés a (created_at, id) kurzor előtt (idx_task_logs_task), időrendben visszaadva.
+# Az id kell a kurzorba: created_at másodperc pontosságú, egy másodpercen belül több esemény is van
+SQL_GET_TASK_LOGS = '''
+    SELECT * FROM (
+        SELECT * FROM task_logs
+        WHERE task_id = ? AND (? IS NULL OR (created_at, id) < (?, ?))
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    )
+    ORDER BY created_at ASC, id ASC
+'''
+
+# Időbélyegek SQLite-ban számolva (ugyanaz a helyi idős ISO formátum, mint a datetime.now().isoformat())
+SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+# Online az agent, ha az utolsó heartbeat ennél frissebb
+SQL_ONLINE_THRESHOLD = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime', '-2 minutes')"
+
+# Find + claim the next task in one atomic statement (two agents can't grab the same task).
+# A platform IN lista hosszától függ, lásd _dispatch_sql
+DISPATCH_SQL = f'''
+    UPDATE tasks SET status = 'assigned', agent_id = ?, assigned_at = {SQL_NOW}
+    WHERE id = (
+        SELECT id FROM tasks
+        WHERE user_id = (SELECT user_id FROM agents WHERE id = ?)
+        AND platform IN ({{placeholders}})
+        AND status = 'pending'
+        AND (scheduled_at IS NULL OR scheduled_at <= {SQL_NOW})
+        ORDER BY priority DESC, created_at ASC
+        LIMIT 1
+    )
+    RETURNING id, platform, task_type, priority, content, media_urls, target_url
+'''
+
+# Heartbeat terhelés alatt ennyi másodpercenként PASSIVE checkpoint fut a WAL méretének kordában tartására
+WAL_CHECKPOINT_INTERVAL = 30
+
+# Heartbeat-ek pufferelve, egy tranzakcióban íródnak ki (másodpercenként, vagy ha a puffer megtelik)
+HEARTBEAT_FLUSH_INTERVAL = 1.0
+HEARTBEAT_BUFFER_MAX = 500
+
+# API key -> user gyorsítótár (minden authentikált kérés ezen megy át)
+API_KEY_CACHE_SIZE = 4096
+API_KEY_CACHE_TTL = 60
+
+# Jelszó hash: PBKDF2-HMAC-SHA256 (stdlib), formátum: pbkdf2_sha256$<iterációk>$<salt>$<hash>
+PASSWORD_HASH_ITERATIONS = 600_000
+# Sikeres bejelentkezések rövid ideig cache-elve, hogy az ismételt login ne fusson újra a KDF-en
+LOGIN_CACHE_SIZE = 1024
+LOGIN_CACHE_TTL = 30
+
+# task_logs írások háttérszálon, kötegelve: max ennyi sor / ennyi másodperc után
+TASK_LOG_BATCH = 100
+TASK_LOG_FLUSH_INTERVAL = 0.5
+# Olvasás előtti flush legfeljebb ennyit vár az íróra (másodperc)
+TASK_LOG_FLUSH_TIMEOUT = 2.0
+
+
+def hash_password(password: str) -> str:
+    """Salted PBKDF2-HMAC-SHA256 hash in 'pbkdf2_sha256$iterations$salt$hash' form"""
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), PASSWORD_HASH_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${salt}${digest.hex()}"
+
+
+def check_password(stored_hash: str, password: str) -> bool:
+    """Verify password against a PBKDF2 hash (or a legacy unsalted SHA-256 hex digest)"""
+    if stored_hash.startswith('pbkdf2_sha256$'):
+        _, iterations, salt, expected = stored_hash.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), int(iterations))
+        return hmac.compare_digest(digest.hex(), expected)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
 
 class TaskStatus(Enum):
     PENDING = "pending"
@@ -37,6 +144,76 @@ class Platform(Enum):
     TIKTOK = "tiktok"
 
 
+def time_ordered_id(prefix: str) -> str:
+    """
+    UUIDv7-szerű azonosító: 48 bit ms timestamp + 48 bit random, 24 hex karakter.
+    Ugyanakkora, mint a korábbi token_hex(12), de időrendben nő, így a PK index végére fűz.
+    """
+    millis = time.time_ns() // 1_000_000
+    return f"{prefix}{millis:012x}{secrets.token_hex(6)}"
+
+
+@functools.lru_cache(maxsize=16)
+def _dispatch_sql(platform_count: int) -> str:
+    """
+    DISPATCH_SQL for a given number of platforms.
+    Same text for the same count, so the connection's statement cache gets hits.
+    """
+    return DISPATCH_SQL.format(placeholders=','.join('?' * platform_count))
+
+
+def _fetch_dicts(cursor) -> List[Dict]:
+    """
+    Fetch the remaining rows as dicts built straight from the raw tuples.
+    Skips the per-row sqlite3.Row object (and its keys() walk) of dict(row).
+    """
+    cursor.row_factory = None
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache whose entries expire after ttl seconds.
+    Keys are blake2b digests, so raw secrets (API keys) are never kept as dict keys.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(secret: str) -> bytes:
+        return hashlib.blake2b(secret.encode(), digest_size=16).digest()
+    
+    def get(self, secret: str) -> Any:
+        key = self._key(secret)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, secret: str, value: Any):
+        key = self._key(secret)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, secret: str):
+        with self._lock:
+            self._data.pop(self._key(secret), None)
+
+
 class SaaSDatabase:
     """
     SaaS Database Extension
@@ -45,19 +222,66 @@ class SaaSDatabase:
     
     def __init__(self, db_path='trending_hub.db'):
         self.db_path = db_path
+        self._local = threading.local()
+        self._heartbeat_buffer: set = set()
+        self._heartbeat_lock = threading.Lock()
+        self._api_key_cache = TTLCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL)
+        self._login_cache = TTLCache(LOGIN_CACHE_SIZE, LOGIN_CACHE_TTL)
+        self._log_q: queue.Queue = queue.Queue()
         self.init_saas_tables()
+        
+        self._stop_workers = threading.Event()
+        self._start_worker('saas-wal-checkpoint', WAL_CHECKPOINT_INTERVAL, self._wal_checkpoint)
+        self._start_worker('saas-heartbeat-flush', HEARTBEAT_FLUSH_INTERVAL, self.flush_heartbeats)
+        threading.Thread(target=self._task_log_writer, name='saas-task-log-writer', daemon=True).start()
+        atexit.register(self.flush_task_logs)
     
     def get_connection(self):
-        """Get database connection with Row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """
+        Get this thread's database connection (Row factory).
+        Opened once per thread, then reused - callers must not close it.
+        Autocommit mode: every statement commits on its own.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(CONNECTION_PRAGMAS)
+            self._local.conn = conn
         return conn
     
+    def close(self):
+        """Close this thread's connection (shutdown)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _start_worker(self, name: str, interval: float, job):
+        """Background daemon thread running job() every interval seconds"""
+        def run():
+            while not self._stop_workers.wait(interval):
+                try:
+                    job()
+                except sqlite3.Error as e:
+                    print(f"⚠️ {name} error: {e}")
+            self.close()
+        
+        threading.Thread(target=run, name=name, daemon=True).start()
+    
+    def _wal_checkpoint(self):
+        """PASSIVE checkpoint: caps WAL growth without blocking readers/writers"""
+        self.get_connection().execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+    
     def init_saas_tables(self):
         """Initialize SaaS-specific tables"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # WAL: a heartbeat commitok WAL-hoz fűznek (nincs teljes fsync), az olvasók nem blokkolnak
+        cursor.execute('PRAGMA journal_mode = WAL').fetchall()
+        
         # ═══════════════════════════════════════════════════════════════
         # USERS TÁBLA - SaaS felhasználók
         # ═══════════════════════════════════════════════════════════════
@@ -162,14 +386,82 @@ class SaaSDatabase:
         # INDEXEK a gyorsabb lekérdezéshez
         # ═══════════════════════════════════════════════════════════════
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks(user_id)')
+        # get_next_task: user_id + status egyenlőség, priority/created_at sorrend (nincs külön sort),
+        # platform/scheduled_at szűrés az indexből. A user_id prefix kiváltja az idx_tasks_user-t.
+        cursor.execute('DROP INDEX IF EXISTS idx_tasks_user')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tasks_dispatch
+            ON tasks(user_id, status, priority DESC, created_at ASC, platform, scheduled_at)
+        ''')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_agent ON tasks(agent_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_scheduled ON tasks(scheduled_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_agents_user ON agents(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_agents_status ON agents(status)')
+        # Részleges indexek: csak az online agent-ek (heartbeat ablak, offline jelölés).
+        # Az alacsony szelektivitású idx_agents_status helyett - különben a planner azt választja.
+        cursor.execute('DROP INDEX IF EXISTS idx_agents_status')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_agents_online
+            ON agents(user_id, last_heartbeat DESC) WHERE status = 'online'
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_agents_heartbeat
+            ON agents(last_heartbeat) WHERE status = 'online'
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_logs_task ON task_logs(task_id, created_at)')
+        
+        # ═══════════════════════════════════════════════════════════════
+        # USER_COUNTERS - triggerekkel karbantartott task számlálók (get_user_stats O(1))
+        # ═══════════════════════════════════════════════════════════════
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_counters'")
+        counters_existed = cursor.fetchone() is not None
+        
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS user_counters (
+                user_id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0,
+                pending INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0
+            );
+            
+            CREATE TRIGGER IF NOT EXISTS tasks_counters_ai AFTER INSERT ON tasks BEGIN
+                INSERT INTO user_counters (user_id, total, pending, completed, failed)
+                VALUES (NEW.user_id, 1, NEW.status = 'pending', NEW.status = 'completed', NEW.status = 'failed')
+                ON CONFLICT(user_id) DO UPDATE SET
+                    total = total + 1,
+                    pending = pending + excluded.pending,
+                    completed = completed + excluded.completed,
+                    failed = failed + excluded.failed;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS tasks_counters_au AFTER UPDATE OF status ON tasks
+            WHEN OLD.status IS NOT NEW.status BEGIN
+                UPDATE user_counters SET
+                    pending = pending + (NEW.status = 'pending') - (OLD.status = 'pending'),
+                    completed = completed + (NEW.status = 'completed') - (OLD.status = 'completed'),
+                    failed = failed + (NEW.status = 'failed') - (OLD.status = 'failed')
+                WHERE user_id = NEW.user_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS tasks_counters_ad AFTER DELETE ON tasks BEGIN
+                UPDATE user_counters SET
+                    total = total - 1,
+                    pending = pending - (OLD.status = 'pending'),
+                    completed = completed - (OLD.status = 'completed'),
+                    failed = failed - (OLD.status = 'failed')
+                WHERE user_id = OLD.user_id;
+            END;
+        ''')
+        
+        # Első indításkor a meglévő taskokból töltjük fel, utána a triggerek tartják karban
+        if not counters_existed:
+            cursor.execute('''
+                INSERT OR IGNORE INTO user_counters (user_id, total, pending, completed, failed)
+                SELECT user_id, COUNT(*), SUM(status = 'pending'), SUM(status = 'completed'), SUM(status = 'failed')
+                FROM tasks GROUP BY user_id
+            ''')
         
         conn.commit()
-        conn.close()
         print("✅ SaaS tables initialized")
     
     # ═══════════════════════════════════════════════════════════════════════
@@ -184,14 +476,18 @@ class SaaSDatabase:
         try:
             user_id = secrets.token_hex(16)
             api_key = f"tm_{secrets.token_hex(24)}"
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            password_hash = hash_password(password)
             
-            cursor.execute('''
+            # Foglalt email (vagy api_key) esetén 0 sor jön vissza, kivétel nélkül
+            rows = cursor.execute('''
                 INSERT INTO users (id, email, password_hash, name, api_key)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, email, password_hash, name, api_key))
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            ''', (user_id, email, password_hash, name, api_key)).fetchall()
             
-            conn.commit()
+            if not rows:
+                return None
             
             return {
                 'id': user_id,
@@ -201,19 +497,28 @@ class SaaSDatabase:
             }
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def get_user_by_api_key(self, api_key: str) -> Optional[Dict]:
-        """Get user by API key"""
+        """
+        Get user by API key.
+        Hits are cached for API_KEY_CACHE_TTL seconds (misses are not cached),
+        so a deactivation takes effect within that window.
+        """
+        user = self._api_key_cache.get(api_key)
+        if user is not None:
+            return dict(user)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE api_key = ? AND is_active = 1', (api_key,))
+        cursor.execute(SQL_GET_USER_BY_KEY, (api_key,))
         row = cursor.fetchone()
-        conn.close()
+        if not row:
+            return None
         
-        return dict(row) if row else None
+        user = dict(row)
+        self._api_key_cache.set(api_key, user)
+        return dict(user)
     
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email"""
@@ -222,27 +527,36 @@ class SaaSDatabase:
         
         cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
         row = cursor.fetchone()
-        conn.close()
         
         return dict(row) if row else None
     
     def verify_user(self, email: str, password: str) -> Optional[Dict]:
-        """Verify user credentials"""
+        """
+        Verify user credentials.
+        A successful check is remembered for LOGIN_CACHE_TTL seconds against the
+        stored hash, so repeated logins skip the KDF (a password change invalidates it).
+        """
         user = self.get_user_by_email(email)
         if not user:
             return None
         
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        if user['password_hash'] != password_hash:
-            return None
+        login_key = f"{email}:{password}"
+        if self._login_cache.get(login_key) != user['password_hash']:
+            if not check_password(user['password_hash'], password):
+                return None
+            
+            # Legacy SHA-256 hash: upgrade to PBKDF2 on the first successful login
+            if not user['password_hash'].startswith('pbkdf2_sha256$'):
+                user['password_hash'] = hash_password(password)
+                self.get_connection().execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                                              (user['password_hash'], user['id']))
+            self._login_cache.set(login_key, user['password_hash'])
         
         # Update last login
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('UPDATE users SET last_login = ? WHERE id = ?', 
-                      (datetime.now().isoformat(), user['id']))
+        cursor.execute(f'UPDATE users SET last_login = {SQL_NOW} WHERE id = ?', (user['id'],))
         conn.commit()
-        conn.close()
         
         return user
     
@@ -257,9 +571,8 @@ class SaaSDatabase:
         cursor = conn.cursor()
         
         try:
-            import json
             agent_id = f"agent_{secrets.token_hex(12)}"
-            caps_json = json.dumps(capabilities or ['facebook', 'instagram', 'twitter'])
+            caps_json = orjson.dumps(capabilities or ['facebook', 'instagram', 'twitter']).decode()
             
             cursor.execute('''
                 INSERT INTO agents (id, user_id, name, hwid_hash, version, capabilities, status)
@@ -276,34 +589,58 @@ class SaaSDatabase:
         except sqlite3.Error as e:
             print(f"❌ Agent registration error: {e}")
             return None
-        finally:
-            conn.close()
     
-    def update_agent_heartbeat(self, agent_id: str, platforms: List[str] = None) -> bool:
-        """Update agent heartbeat and status"""
+    def update_agent_heartbeat(self, agent_id: str) -> None:
+        """
+        Record agent heartbeat (buffered; callers check the agent exists).
+        The background flusher writes it (stamped at flush time) within
+        HEARTBEAT_FLUSH_INTERVAL; a full buffer is flushed right away by the caller.
+        """
+        with self._heartbeat_lock:
+            self._heartbeat_buffer.add(agent_id)
+            full = len(self._heartbeat_buffer) >= HEARTBEAT_BUFFER_MAX
+        
+        if full:
+            try:
+                self.flush_heartbeats()
+            except sqlite3.Error as e:
+                # The beats went back into the buffer - the background flusher retries them
+                print(f"⚠️ Heartbeat flush error: {e}")
+    
+    def flush_heartbeats(self) -> int:
+        """Write buffered heartbeats in a single transaction"""
+        with self._heartbeat_lock:
+            if not self._heartbeat_buffer:
+                return 0
+            beats = [(agent_id,) for agent_id in self._heartbeat_buffer]
+            self._heartbeat_buffer.clear()
+        
         conn = self.get_connection()
         cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany(f'''
                 UPDATE agents 
-                SET last_heartbeat = ?, status = 'online'
+                SET last_heartbeat = {SQL_NOW}, status = 'online'
                 WHERE id = ?
-            ''', (datetime.now().isoformat(), agent_id))
-            
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            ''', beats)
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            # Put them back for the next flush
+            with self._heartbeat_lock:
+                self._heartbeat_buffer.update(agent_id for agent_id, in beats)
+            raise
+        return len(beats)
     
     def get_agent(self, agent_id: str) -> Optional[Dict]:
         """Get agent by ID"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM agents WHERE id = ?', (agent_id,))
+        cursor.execute(SQL_GET_AGENT, (agent_id,))
         row = cursor.fetchone()
-        conn.close()
         
         return dict(row) if row else None
     
@@ -317,10 +654,7 @@ class SaaSDatabase:
             ORDER BY registered_at DESC
         ''', (user_id,))
         
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        return _fetch_dicts(cursor)
     
     def get_online_agents(self, user_id: str, platform: str = None) -> List[Dict]:
         """Get online agents for user, optionally filtered by platform capability"""
@@ -328,41 +662,31 @@ class SaaSDatabase:
         cursor = conn.cursor()
         
         # Agent is online if heartbeat within last 2 minutes
-        threshold = (datetime.now() - timedelta(minutes=2)).isoformat()
-        
-        cursor.execute('''
+        # (status = 'online' matches the idx_agents_online partial index)
+        # Platform filter (if specified) runs inside SQLite via JSON1 - non-matching rows never materialize
+        cursor.execute(f'''
             SELECT * FROM agents 
-            WHERE user_id = ? AND last_heartbeat > ?
+            WHERE user_id = :user_id AND status = 'online' AND last_heartbeat > {SQL_ONLINE_THRESHOLD}
+            AND (:platform IS NULL OR EXISTS (
+                SELECT 1 FROM json_each(agents.capabilities) WHERE value = :platform
+            ))
             ORDER BY last_heartbeat DESC
-        ''', (user_id, threshold))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        agents = [dict(row) for row in rows]
+        ''', {'user_id': user_id, 'platform': platform or None})
         
-        # Filter by platform if specified
-        if platform:
-            import json
-            agents = [a for a in agents if platform in json.loads(a.get('capabilities', '[]'))]
-        
-        return agents
+        return _fetch_dicts(cursor)
     
     def mark_offline_agents(self) -> int:
         """Mark agents as offline if no heartbeat in 2 minutes"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        threshold = (datetime.now() - timedelta(minutes=2)).isoformat()
-        
-        cursor.execute('''
+        cursor.execute(f'''
             UPDATE agents SET status = 'offline'
-            WHERE last_heartbeat < ? AND status = 'online'
-        ''', (threshold,))
+            WHERE last_heartbeat < {SQL_ONLINE_THRESHOLD} AND status = 'online'
+        ''')
         
         count = cursor.rowcount
         conn.commit()
-        conn.close()
         
         return count
     
@@ -379,12 +703,15 @@ class SaaSDatabase:
         try:
             account_id = f"acc_{secrets.token_hex(8)}"
             
-            cursor.execute('''
+            rows = cursor.execute('''
                 INSERT INTO platform_accounts (id, user_id, agent_id, platform, account_name)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (account_id, user_id, agent_id, platform, account_name))
+                ON CONFLICT(agent_id, platform, account_name) DO NOTHING
+                RETURNING id
+            ''', (account_id, user_id, agent_id, platform, account_name)).fetchall()
             
-            conn.commit()
+            if not rows:
+                return None
             
             return {
                 'id': account_id,
@@ -393,23 +720,15 @@ class SaaSDatabase:
             }
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def get_agent_platforms(self, agent_id: str) -> List[Dict]:
         """Get all platform accounts for agent"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM platform_accounts 
-            WHERE agent_id = ? AND is_active = 1
-        ''', (agent_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        cursor.execute(SQL_GET_AGENT_PLATFORMS, (agent_id,))
         
-        return [dict(row) for row in rows]
+        return _fetch_dicts(cursor)
     
     # ═══════════════════════════════════════════════════════════════════════
     # TASK MANAGEMENT
@@ -424,9 +743,8 @@ class SaaSDatabase:
         cursor = conn.cursor()
         
         try:
-            import json
-            task_id = f"task_{secrets.token_hex(12)}"
-            media_json = json.dumps(media_urls or [])
+            task_id = time_ordered_id('task_')
+            media_json = orjson.dumps(media_urls or []).decode()
             
             # Ha scheduled_at nincs megadva, azonnal pending
             status = 'pending' if not scheduled_at else 'scheduled'
@@ -452,12 +770,53 @@ class SaaSDatabase:
         except sqlite3.Error as e:
             print(f"❌ Task creation error: {e}")
             return None
-        finally:
-            conn.close()
     
+    def create_tasks_bulk(self, user_id: str, tasks: List[Dict]) -> List[str]:
+        """
+        Create many tasks in one transaction (campaign scheduling).
+        Each dict takes the create_task keyword arguments; returns the new task ids.
+        """
+        if not tasks:
+            return []
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        task_rows = []
+        log_rows = []
+        for task in tasks:
+            task_id = time_ordered_id('task_')
+            status = 'pending' if not task.get('scheduled_at') else 'scheduled'
+            task_rows.append((task_id, user_id, task['platform'], task['task_type'], status,
+                              task.get('priority', 5), task.get('content'), task.get('target_url'),
+                              orjson.dumps(task.get('media_urls') or []).decode(),
+                              task.get('scheduled_at')))
+            log_rows.append((task_id, 'created',
+                             f"Task created: {task['task_type']} on {task['platform']}"))
+
+        try:
+            # Task és log sorok egy tranzakcióban (a log itt nem megy át a háttér queue-n)
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('''
+                INSERT INTO tasks (id, user_id, platform, task_type, status, priority,
+                                   content, target_url, media_urls, scheduled_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', task_rows)
+            cursor.executemany('''
+                INSERT INTO task_logs (task_id, event_type, message) VALUES (?, ?, ?)
+            ''', log_rows)
+            cursor.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            print(f"❌ Bulk task creation error: {e}")
+            return []
+
+        return [row[0] for row in task_rows]
+
     def get_next_task(self, agent_id: str, platforms: List[str]) -> Optional[Dict]:
         """
-        Get next available task for agent.
+        Get next available task for agent (only the columns the agent needs to run it).
         Prioritás: 
         1. scheduled_at <= now
         2. priority (magasabb = fontosabb)
@@ -466,47 +825,12 @@ class SaaSDatabase:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Get agent's user
-        cursor.execute('SELECT user_id FROM agents WHERE id = ?', (agent_id,))
-        agent_row = cursor.fetchone()
-        if not agent_row:
-            conn.close()
-            return None
-        
-        user_id = agent_row['user_id']
-        now = datetime.now().isoformat()
-        
-        # Platform placeholder for IN clause
-        placeholders = ','.join(['?' for _ in platforms])
-        
-        # Find next task
-        query = f'''
-            SELECT * FROM tasks
-            WHERE user_id = ?
-            AND platform IN ({placeholders})
-            AND status = 'pending'
-            AND (scheduled_at IS NULL OR scheduled_at <= ?)
-            ORDER BY priority DESC, created_at ASC
-            LIMIT 1
-        '''
-        
-        cursor.execute(query, [user_id] + platforms + [now])
-        row = cursor.fetchone()
-        
-        if not row:
-            conn.close()
+        # fetchall() steps the statement to completion so the autocommit write is finalized
+        rows = cursor.execute(_dispatch_sql(len(platforms)), [agent_id, agent_id] + platforms).fetchall()
+        if not rows:
             return None
         
-        task = dict(row)
-        
-        # Assign task to agent
-        cursor.execute('''
-            UPDATE tasks SET status = 'assigned', agent_id = ?, assigned_at = ?
-            WHERE id = ?
-        ''', (agent_id, now, task['id']))
-        
-        conn.commit()
-        conn.close()
+        task = dict(rows[0])
         
         # Log assignment
         self._log_task_event(task['id'], agent_id, 'assigned', f'Assigned to agent {agent_id}')
@@ -519,58 +843,48 @@ class SaaSDatabase:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        try:
-            now = datetime.now().isoformat()
-            
-            if status == 'in_progress':
-                cursor.execute('''
-                    UPDATE tasks SET status = ?, started_at = ?
-                    WHERE id = ?
-                ''', (status, now, task_id))
-            elif status in ['completed', 'failed']:
-                cursor.execute('''
-                    UPDATE tasks SET status = ?, completed_at = ?, error_message = ?, result = ?
-                    WHERE id = ?
-                ''', (status, now, error_message, result, task_id))
-            else:
-                cursor.execute('''
-                    UPDATE tasks SET status = ?
-                    WHERE id = ?
-                ''', (status, task_id))
-            
-            conn.commit()
-            
-            # Log status change
-            self._log_task_event(task_id, agent_id, f'status_{status}', 
-                               error_message or f'Status changed to {status}')
-            
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+        if status == 'in_progress':
+            cursor.execute(f'''
+                UPDATE tasks SET status = ?, started_at = {SQL_NOW}
+                WHERE id = ?
+            ''', (status, task_id))
+        elif status in ['completed', 'failed']:
+            cursor.execute(f'''
+                UPDATE tasks SET status = ?, completed_at = {SQL_NOW}, error_message = ?, result = ?
+                WHERE id = ?
+            ''', (status, error_message, result, task_id))
+        else:
+            cursor.execute('''
+                UPDATE tasks SET status = ?
+                WHERE id = ?
+            ''', (status, task_id))
+        
+        conn.commit()
+        
+        # Log status change
+        self._log_task_event(task_id, agent_id, f'status_{status}', 
+                           error_message or f'Status changed to {status}')
+        
+        return cursor.rowcount > 0
     
     def retry_failed_task(self, task_id: str) -> bool:
         """Retry failed task if retries available"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT retry_count, max_retries FROM tasks WHERE id = ?', (task_id,))
-        row = cursor.fetchone()
-        
-        if not row or row['retry_count'] >= row['max_retries']:
-            conn.close()
-            return False
-        
-        cursor.execute('''
+        # One conditional statement: SQLite enforces the retry bound, concurrent retries can't overshoot
+        rows = cursor.execute('''
             UPDATE tasks 
             SET status = 'pending', retry_count = retry_count + 1,
                 agent_id = NULL, assigned_at = NULL, started_at = NULL
-            WHERE id = ?
-        ''', (task_id,))
+            WHERE id = ? AND retry_count < max_retries
+            RETURNING retry_count
+        ''', (task_id,)).fetchall()
         
-        conn.commit()
-        conn.close()
+        if not rows:
+            return False
         
-        self._log_task_event(task_id, None, 'retry', f'Retry #{row["retry_count"] + 1}')
+        self._log_task_event(task_id, None, 'retry', f'Retry #{rows[0]["retry_count"]}')
         
         return True
     
@@ -590,19 +904,15 @@ class SaaSDatabase:
                 ORDER BY created_at DESC LIMIT ?
             ''', (user_id, limit))
         
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        return _fetch_dicts(cursor)
     
     def get_task(self, task_id: str) -> Optional[Dict]:
         """Get single task by ID"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
+        cursor.execute(SQL_GET_TASK, (task_id,))
         row = cursor.fetchone()
-        conn.close()
         
         return dict(row) if row else None
     
@@ -612,35 +922,83 @@ class SaaSDatabase:
     
     def _log_task_event(self, task_id: str, agent_id: str, event_type: str, 
                         message: str, details: str = None):
-        """Internal: Log task event"""
+        """Internal: Log task event (queued, written in batches by the log writer thread)"""
+        # Same format as CURRENT_TIMESTAMP, stamped now rather than at flush time
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._log_q.put_nowait((task_id, agent_id, event_type, message, details, created_at))
+    
+    def _write_task_logs(self, rows: List[tuple]):
+        """Insert a batch of task log rows in one transaction (log loss is not fatal)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO task_logs (task_id, agent_id, event_type, message, details)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (task_id, agent_id, event_type, message, details))
-            conn.commit()
-        except:
-            pass
-        finally:
-            conn.close()
+            cursor.execute('BEGIN')
+            cursor.executemany('''
+                INSERT INTO task_logs (task_id, agent_id, event_type, message, details, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            print(f"⚠️ Task log write error ({len(rows)} rows dropped): {e}")
     
-    def get_task_logs(self, task_id: str) -> List[Dict]:
-        """Get logs for task"""
+    def _task_log_writer(self):
+        """
+        Daemon: drain the log queue every TASK_LOG_FLUSH_INTERVAL or TASK_LOG_BATCH rows.
+        An Event in the queue is a flush request: the batch so far is written
+        at once and the Event is set.
+        """
+        while True:
+            rows, waiters = [], []
+            try:
+                item = self._log_q.get()
+                deadline = time.monotonic() + TASK_LOG_FLUSH_INTERVAL
+                while True:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        break
+                    rows.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(rows) >= TASK_LOG_BATCH or remaining <= 0:
+                        break
+                    try:
+                        item = self._log_q.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if rows:
+                    self._write_task_logs(rows)
+            except Exception as e:
+                # The writer must outlive any bad batch
+                print(f"⚠️ Task log writer error ({len(rows)} rows dropped): {e}")
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+    
+    def flush_task_logs(self, timeout: float = TASK_LOG_FLUSH_TIMEOUT) -> bool:
+        """
+        Wait until the rows queued before this call are written (reads, shutdown).
+        Rows logged by other threads meanwhile are not waited for.
+        Returns False if the writer did not get there within `timeout`.
+        """
+        done = threading.Event()
+        self._log_q.put_nowait(done)
+        return done.wait(timeout)
+    
+    def get_task_logs(self, task_id: str, limit: int = 200, before: str = None,
+                      before_id: int = None) -> List[Dict]:
+        """
+        Get logs for task (oldest first).
+        Returns the latest `limit` entries; pass the first entry's created_at
+        and id as `before` / `before_id` to page further back.
+        """
+        self.flush_task_logs()
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM task_logs WHERE task_id = ?
-            ORDER BY created_at ASC
-        ''', (task_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        cursor.execute(SQL_GET_TASK_LOGS, (task_id, before, before, before_id, limit))
         
-        return [dict(row) for row in rows]
+        return _fetch_dicts(cursor)
     
     # ═══════════════════════════════════════════════════════════════════════
     # STATISTICS
@@ -651,38 +1009,24 @@ class SaaSDatabase:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Agent counts
-        cursor.execute('SELECT COUNT(*) FROM agents WHERE user_id = ?', (user_id,))
-        total_agents = cursor.fetchone()[0]
+        # Agent counts (one pass)
+        cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(last_heartbeat > {SQL_ONLINE_THRESHOLD}), 0)
+            FROM agents WHERE user_id = ?
+        ''', (user_id,))
+        total_agents, online_agents = cursor.fetchone()
         
+        # Task counts (trigger-maintained user_counters row, no tasks scan)
         cursor.execute('''
-            SELECT COUNT(*) FROM agents 
-            WHERE user_id = ? AND last_heartbeat > ?
-        ''', (user_id, (datetime.now() - timedelta(minutes=2)).isoformat()))
-        online_agents = cursor.fetchone()[0]
-        
-        # Task counts
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE user_id = ?', (user_id,))
-        total_tasks = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = ?', 
-                      (user_id, 'completed'))
-        completed_tasks = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = ?', 
-                      (user_id, 'failed'))
-        failed_tasks = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = ?', 
-                      (user_id, 'pending'))
-        pending_tasks = cursor.fetchone()[0]
+            SELECT total, completed, failed, pending
+            FROM user_counters WHERE user_id = ?
+        ''', (user_id,))
+        total_tasks, completed_tasks, failed_tasks, pending_tasks = cursor.fetchone() or (0, 0, 0, 0)
         
         # Platform accounts
         cursor.execute('SELECT COUNT(*) FROM platform_accounts WHERE user_id = ?', (user_id,))
         total_accounts = cursor.fetchone()[0]
         
-        conn.close()
-        
         return {
             'agents': {
                 'total': total_agents,
@@ -0,0 +1,147 @@
+"""
+Document text extraction for TrendMaster (Doksiból Poszt, style upload)
+Kept out of app.py so the PDF page jobs unpickle without the Flask app. Note that
+spawned workers still re-import the parent's __main__ (as __mp_main__): under
+`python app.py` that is app.py, which skips starting the scheduler in that case
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Optional
+
+SUPPORTED_EXTENSIONS = ['docx', 'pdf', 'md', 'txt']
+
+# Below this page count the process pool start-up costs more than it saves
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_MAX_WORKERS = 8
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    Shared PDF worker pool, created on first use.
+
+    Workers are spawned, not forked: the gunicorn worker already runs the
+    scheduler, log listener and event loop threads, and a forked child could
+    inherit one of their locks held. Spawning re-imports __main__ in every
+    worker - app.py guards its scheduler start against that.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=min(PDF_MAX_WORKERS, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+    return _pdf_pool
+
+
+def _extract_pdf_page(path: str, page_number: int) -> str:
+    """Worker: open the PDF and extract a single (1-based) page."""
+    import pdfplumber
+    with pdfplumber.open(path, pages=[page_number]) as pdf:
+        return pdf.pages[0].extract_text() or ''
+
+
+def extract_pdf_text(path: str, max_chars: Optional[int] = None) -> str:
+    """
+    Extract text from a PDF file, page by page.
+
+    Large PDFs are split across a process pool (pdfplumber is pure Python
+    and holds the GIL). Pages are consumed in order, and once max_chars
+    is reached the pages not yet started are cancelled.
+    """
+    import pdfplumber
+
+    pages_text = []
+    total = 0
+
+    with pdfplumber.open(path) as pdf:
+        page_count = len(pdf.pages)
+
+        if page_count < PDF_PARALLEL_MIN_PAGES:
+            for page in pdf.pages:
+                text = page.extract_text()
+                if text:
+                    pages_text.append(text)
+                    total += len(text)
+                if max_chars and total >= max_chars:
+                    break
+            return '\n\n'.join(pages_text)
+
+    executor = _get_pdf_pool()
+    futures = [
+        executor.submit(_extract_pdf_page, path, number)
+        for number in range(1, page_count + 1)
+    ]
+    try:
+        for future in futures:
+            text = future.result()
+            if text:
+                pages_text.append(text)
+                total += len(text)
+            if max_chars and total >= max_chars:
+                break
+    finally:
+        # Pages not yet started are dropped (early stop or a failed page)
+        for pending in futures:
+            pending.cancel()
+
+    return '\n\n'.join(pages_text)
+
+
+def _read_text(stream: BinaryIO, max_chars: Optional[int] = None) -> str:
+    """Read UTF-8 text, stopping after max_chars characters (not bytes)."""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8')
+    try:
+        return text_stream.read(max_chars or -1)
+    finally:
+        # Hand the upload stream back instead of closing it with the wrapper
+        text_stream.detach()
+
+
+def extract_document_text(stream: BinaryIO, ext: str, max_chars: Optional[int] = None) -> str:
+    """
+    Extract plain text from an uploaded document stream.
+
+    txt/md/docx are parsed straight from the (seekable) upload stream.
+    PDFs still go through a temp file because the page-parallel workers
+    reopen the document by path.
+    """
+    if ext == 'txt':
+        return _read_text(stream, max_chars)
+
+    if ext == 'md':
+        import markdown
+        from bs4 import BeautifulSoup
+        html = markdown.markdown(_read_text(stream, max_chars))
+        return BeautifulSoup(html, 'html.parser').get_text()
+
+    if ext == 'docx':
+        from docx import Document
+        doc = Document(stream)
+        paragraphs = []
+        total = 0
+        for para in doc.paragraphs:
+            if para.text.strip():
+                paragraphs.append(para.text)
+                total += len(para.text)
+                if max_chars and total >= max_chars:
+                    break
+        return '\n\n'.join(paragraphs)
+
+    if ext == 'pdf':
+        with tempfile.NamedTemporaryFile(prefix='upload_', suffix='.pdf', delete=False) as temp_file:
+            shutil.copyfileobj(stream, temp_file)
+        try:
+            return extract_pdf_text(temp_file.name, max_chars=max_chars)
+        finally:
+            os.remove(temp_file.name)
+
+    raise ValueError(f'Unsupported file type: {ext}')
@@ -2,70 +2,337 @@
 Facebook Poster Module
 Használja a Firefox session-t Facebook posztolásra
 Nincs szükség Facebook App-ra vagy OAuth-ra!
+
+A Firefox profilból csak a Facebook cookie-k kerülnek át egy Playwright
+storageState JSON-ba; minden poszt ezt tölti be egy friss browser context-be.
 """
 import asyncio
+import json
+import logging
 from pathlib import Path
 import shutil
+import sqlite3
 import tempfile
-from playwright.async_api import async_playwright
+import time
+from async_utils import LoopThread
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import os
 
+logger = logging.getLogger("facebook_poster")
+
+# Exportált Facebook session (Playwright storageState) - titkos, ne kerüljön verziókezelésbe
+DEFAULT_STATE_PATH = Path(__file__).resolve().parent / "fb_state.json"
+
+# A cookie pillanatkép RAM-ban (tmpfs) készül, ha van /dev/shm
+# (kód nélküli alternatíva: TMPDIR=/dev/shm a folyamat környezetében)
+SNAPSHOT_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+NOT_LOGGED_IN_MESSAGE = 'Nincs bejelentkezve Facebook! Jelentkezz be egyszer Firefoxban.'
+
+# publish_many_to_facebook: egyszerre ennyi context (fül) posztol ugyanabban a Firefoxban
+MAX_PARALLEL_POSTS = 3
+
+# Posztoláshoz felesleges Firefox alrendszerek kikapcsolva (telemetria, safe browsing, Pocket, frissítés...)
+FIREFOX_USER_PREFS = {
+    'toolkit.telemetry.enabled': False,
+    'datareporting.healthreport.uploadEnabled': False,
+    'browser.safebrowsing.malware.enabled': False,
+    'browser.safebrowsing.phishing.enabled': False,
+    'browser.safebrowsing.downloads.enabled': False,
+    'extensions.pocket.enabled': False,
+    'app.update.auto': False,
+    'browser.newtabpage.enabled': False,
+    'network.prefetch-next': False,
+    'layers.acceleration.disabled': True,
+}
+
+# Posztoláshoz nem kellő letöltések (feed képek, videók, fontok) - a hálózati rétegen eldobva
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font', 'websocket'})
+
+# Facebook selectorok - modul szinten, egyszer összefűzve: minden lista egyetlen locator lekérdezés
+# (több találatnál a DOM sorrend dönt, nem a lista sorrendje)
+
+# Login jelzők - ha bármelyik látszik, be vagyunk jelentkezve
+_LOGIN_INDICATORS = ', '.join((
+    'div[aria-label*="Create"]',
+    'div[aria-label*="Bejegyzés"]',
+    'span:has-text("What\'s on your mind")',
+    'span:has-text("Mi jár a fejedben")',
+))
+_CREATE_SELECTORS = ', '.join((
+    'div[aria-label="Create a post"]',
+    'div[aria-label="Bejegyzés létrehozása"]',
+))
+# A poszt szerkesztő dialógus; a szöveg/fotó/Post elemeket ezen belül keressük
+_DIALOG_SELECTOR = 'div[role="dialog"]'
+_DIALOG_EDITOR_SELECTOR = 'div[role="dialog"] div[contenteditable="true"]'
+_TEXTAREA_SELECTORS = ', '.join((
+    'div[contenteditable="true"]',
+    'div[aria-label*="mind"]',
+    'div[aria-label*="fejedben"]',
+    'div[role="textbox"]',
+))
+# FONTOS: NE találjuk meg az "Élő videó" gombot!
+_PHOTO_BUTTON_SELECTORS = ', '.join((
+    # Aria label alapú keresés - PONTOS egyezés
+    '[aria-label="Fotó/videó"]',
+    '[aria-label="Photo/video"]',
+    '[aria-label="Fényképek/videók"]',
+    '[aria-label="Photos/videos"]',
+    # Fotó szó kötelező, de videó nélkül NE keresse az Élő videót!
+    '[aria-label*="Fotó"][aria-label*="videó"]',
+    '[aria-label*="Photo"][aria-label*="video"]',
+    # Text alapú - az "Elhelyezés a bejegyzésben" sor első gombja
+    'div:has-text("Elhelyezés a bejegyzésben") ~ div [role="button"]',
+    'div:has-text("Add to your post") ~ div [role="button"]',
+))
+# A feed képei is facebook src-jűek, ezért csak a blob preview számít
+_IMG_PREVIEW_SELECTOR = 'img[src*="blob"]'
+_POST_BUTTON_SELECTORS = ', '.join((
+    'div[aria-label="Post"]',
+    'div[aria-label="Közzététel"]',
+    'div[aria-label="Publish"]',
+))
+# Feltöltés közben a Közzététel gomb le van tiltva
+_POST_BUTTON_ENABLED = ', '.join((
+    'div[aria-label="Post"]:not([aria-disabled="true"])',
+    'div[aria-label="Közzététel"]:not([aria-disabled="true"])',
+))
+_COMMENT_BUTTON_SELECTORS = ', '.join((
+    'div[aria-label="Hozzászólás"]',
+    'div[aria-label="Comment"]',
+    'span:has-text("Hozzászólás")',
+))
+_COMMENT_SELECTORS = ', '.join((
+    'div[aria-label="Írj hozzászólást..."]',
+    'div[aria-label*="Írj"]',
+    'div[aria-label*="Write a comment"]',
+    'div[aria-label*="hozzászólás"]',
+    'div[contenteditable="true"][data-lexical-editor="true"]',
+    'div[contenteditable="true"][role="textbox"]',
+))
+
+# moz_cookies.sameSite -> Playwright sameSite
+_SAME_SITE = {0: 'None', 1: 'Lax', 2: 'Strict'}
+
+
+def _fast_clone(source: Path, dest: Path):
+    """
+    Copy a file with copy_file_range: a reflink (CoW clone) on btrfs/XFS,
+    an in-kernel copy elsewhere. Falls back to shutil.copy2 where unsupported.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copy2(source, dest)
+        return
+    try:
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                pass
+    except OSError:
+        # EXDEV (régebbi kernel, eltérő fájlrendszer), EOPNOTSUPP, stb.
+        shutil.copy2(source, dest)
+
+
+def export_storage_state(profile_path, state_path=DEFAULT_STATE_PATH) -> Path:
+    """
+    Facebook cookie-k kiírása a Firefox profilból Playwright storageState JSON-ba.
+
+    A futó Firefox zárolja a cookies.sqlite-ot, ezért egy pillanatképet olvasunk
+    (csak a cookie adatbázis és a WAL-ja másolódik, pár száz KB).
+    """
+    profile_path = Path(profile_path)
+    state_path = Path(state_path)
+
+    if not (profile_path / "cookies.sqlite").exists():
+        raise FileNotFoundError(f"cookies.sqlite nem található: {profile_path}")
+
+    snapshot_dir = Path(tempfile.mkdtemp(prefix="firefox_fb_", dir=SNAPSHOT_ROOT))
+    try:
+        for name in ("cookies.sqlite", "cookies.sqlite-wal"):
+            source = profile_path / name
+            if source.exists():
+                _fast_clone(source, snapshot_dir / name)
+
+        conn = sqlite3.connect(snapshot_dir / "cookies.sqlite")
+        try:
+            rows = conn.execute(
+                "SELECT name, value, host, path, expiry, isSecure, isHttpOnly, sameSite "
+                "FROM moz_cookies WHERE host LIKE '%facebook.com'"
+            ).fetchall()
+        finally:
+            conn.close()
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    cookies = []
+    for name, value, host, path, expiry, secure, http_only, same_site in rows:
+        # Újabb Firefox verziók ms-ban tárolják a lejáratot
+        if expiry > 10_000_000_000:
+            expiry //= 1000
+        cookies.append({
+            'name': name,
+            'value': value,
+            'domain': host,
+            'path': path,
+            'expires': expiry if expiry > 0 else -1,
+            'httpOnly': bool(http_only),
+            'secure': bool(secure),
+            'sameSite': _SAME_SITE.get(same_site, 'None'),
+        })
+
+    # Csak a tulajdonos olvashatja (session cookie-k)
+    fd = os.open(state_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'cookies': cookies, 'origins': []}, f)
+
+    return state_path
+
+
+async def _wait_for(page, selector: str, timeout: int, state: str = 'visible') -> bool:
+    """wait_for_selector, ami timeout esetén False-t ad vissza kivétel helyett"""
+    try:
+        await page.wait_for_selector(selector, state=state, timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+async def _insert_text(page, element, text: str):
+    """
+    Szöveg beillesztése egyetlen insertText eseménnyel (karakterenkénti gépelés helyett).
+    Az esetleges piszkozatot előtte töröljük; ha a Lexical szerkesztő nem fogadta el,
+    execCommand('insertText') a tartalék.
+    """
+    await element.press('Control+a')
+    await element.press('Delete')
+    await page.keyboard.insert_text(text)
+    if not (await element.inner_text()).strip():
+        await element.evaluate(
+            "(el, text) => { el.focus(); document.execCommand('insertText', false, text); }", text
+        )
+
+
+async def _route_resources(route):
+    """Abort heavy feed resources; the upload's blob: preview and /photos/ pages still load"""
+    request = route.request
+    if (request.resource_type in BLOCKED_RESOURCE_TYPES
+            and not request.url.startswith('blob:')
+            and '/photos/' not in request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
 
 class FacebookPoster:
     """Firefox session-t használó Facebook poster"""
 
-    def __init__(self, firefox_profile_path=None):
+    def __init__(self, firefox_profile_path=None, state_path=None):
         """
         Args:
             firefox_profile_path: Firefox profil path (opcionális)
                                  Ha nincs megadva, az alapértelmezett Snap Firefox profilt használja
+            state_path: storageState JSON path (opcionális, alapértelmezés: fb_state.json)
         """
         if firefox_profile_path is None:
             # Snap Firefox alapértelmezett profil
             firefox_profile_path = Path.home() / "snap/firefox/common/.mozilla/firefox/8pxrtgul.default"
 
         self.source_profile = Path(firefox_profile_path)
+        self.state_path = Path(state_path) if state_path else DEFAULT_STATE_PATH
 
-        if not self.source_profile.exists():
+        # Egy korábban exportált storageState profil nélkül is elég (pl. szerveren)
+        if not self.source_profile.exists() and not self.state_path.exists():
             raise FileNotFoundError(
                 f"Firefox profil nem található: {self.source_profile}\n"
                 f"Ellenőrizd, hogy be vagy-e jelentkezve Firefoxban!"
             )
 
-        # Temporary directory for profile copy
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="firefox_fb_"))
-
-    def copy_profile(self):
-        """Copy Firefox profile to temporary location"""
-        # Only copy essential files for faster startup
-        essential_files = [
-            "cookies.sqlite",
-            "cookies.sqlite-shm",
-            "cookies.sqlite-wal",
-            "sessionstore.jsonlz4",
-            "sessionstore-backups",
-            "storage",
-            "storage.sqlite"
+        # Debug screenshot-ok csak FB_POSTER_DEBUG esetén (a /tmp-be)
+        self.debug = bool(os.environ.get("FB_POSTER_DEBUG"))
+
+        # Playwright / böngésző / context / oldal - az async with session alatt él
+        self._pw = None
+        self._browser = None
+        self._context = None
+        self._page = None
+
+    def ensure_storage_state(self) -> Path:
+        """Re-export the storageState if it is missing or older than the profile's cookies"""
+        cookie_files = [
+            path for path in (self.source_profile / "cookies.sqlite",
+                              self.source_profile / "cookies.sqlite-wal")
+            if path.exists()
         ]
+        if cookie_files:
+            newest = max(path.stat().st_mtime for path in cookie_files)
+            if not self.state_path.exists() or self.state_path.stat().st_mtime < newest:
+                export_storage_state(self.source_profile, self.state_path)
 
-        for item in essential_files:
-            source = self.source_profile / item
-            if source.exists():
-                dest = self.temp_dir / item
-                try:
-                    if source.is_file():
-                        shutil.copy2(source, dest)
-                    elif source.is_dir():
-                        shutil.copytree(source, dest, dirs_exist_ok=True)
-                except Exception:
-                    pass  # Skip if copy fails
+        return self.state_path
 
-        return self.temp_dir
+    def has_fb_session(self) -> bool:
+        """
+        Van-e érvényes Facebook login cookie (c_user) a storageState-ben.
+        Böngésző indítása nélkül, ezredmásodpercek alatt kiszűri a kijelentkezett állapotot.
+        """
+        try:
+            state = json.loads(self.ensure_storage_state().read_text())
+        except (OSError, ValueError, sqlite3.Error):
+            return False
+
+        now = time.time()
+        return any(
+            cookie['name'] == 'c_user' and (cookie['expires'] == -1 or cookie['expires'] > now)
+            for cookie in state.get('cookies', [])
+        )
+
+    async def __aenter__(self):
+        """Start Playwright, launch Firefox once and open the page reused by every post()"""
+        # Cookie pillanatkép + JSON írás blokkoló I/O - ne a loop szálán fusson
+        state_path = await asyncio.to_thread(self.ensure_storage_state)
+
+        self._pw = await async_playwright().start()
+        try:
+            # Firefox indítása, a session cookie-k a storageState-ből jönnek
+            self._browser = await self._pw.firefox.launch(headless=True, firefox_user_prefs=FIREFOX_USER_PREFS)
+            self._context = await self._new_context(str(state_path))
+            self._page = await self._context.new_page()
+        except Exception:
+            await self.close()
+            raise
+
+        return self
+
+    async def _new_context(self, state_path: str):
+        """New browser context with the Facebook session; heavy resources blocked unless debugging"""
+        context = await self._browser.new_context(storage_state=state_path)
+        # Debug módban minden betöltődik, hogy a screenshot-ok teljesek legyenek
+        if not self.debug:
+            await context.route('**/*', _route_resources)
+        return context
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close the page's context, the browser and Playwright"""
+        try:
+            if self._context:
+                await self._context.close()
+            if self._browser:
+                await self._browser.close()
+        finally:
+            if self._pw:
+                await self._pw.stop()
+            self._pw = self._browser = self._context = self._page = None
 
     async def post(self, post_text: str, image_path: str = None, comment_text: str = None):
         """
         Facebook poszt publikálás
 
+        Session-ben (async with) a már futó böngészőt használja, így több poszt
+        csak egyszer indítja a Firefoxot; enélkül egyszeri session-t nyit.
+
         Args:
             post_text: A poszt szövege
             image_path: Opcionális kép path
@@ -75,406 +342,231 @@ class FacebookPoster:
             dict: {
                 'success': bool,
                 'message': str,
-                'screenshot': str (opcionális)
+                'screenshot': str (csak FB_POSTER_DEBUG esetén, különben None)
             }
         """
-        # Copy profile first
-        profile_dir = self.copy_profile()
+        # async with nélkül: egyszeri session csak erre a posztra
+        if self._page is None:
+            if not await asyncio.to_thread(self.has_fb_session):
+                return {'success': False, 'message': NOT_LOGGED_IN_MESSAGE}
+            async with self:
+                return await self.post(post_text, image_path, comment_text)
 
-        try:
-            async with async_playwright() as p:
-                # Firefox indítása persistent context-tel
-                context = await p.firefox.launch_persistent_context(
-                    str(profile_dir),
-                    headless=False,
-                    args=['--disable-blink-features=AutomationControlled'],
-                    slow_mo=500
-                )
+        return await self._publish(self._page, post_text, image_path, comment_text)
+
+    async def post_many(self, items: list, max_parallel: int = MAX_PARALLEL_POSTS) -> list:
+        """
+        Több poszt párhuzamosan: egy böngésző, posztonként saját context (fül),
+        legfeljebb max_parallel egyszerre.
+
+        Args:
+            items: [{'post_content': str, 'image_path': str?, 'comment_text': str?}, ...]
+
+        Returns:
+            list: post() eredmény dict-ek az items sorrendjében
+        """
+        if self._browser is None:
+            if not await asyncio.to_thread(self.has_fb_session):
+                return [{'success': False, 'message': NOT_LOGGED_IN_MESSAGE} for _ in items]
+            async with self:
+                return await self.post_many(items, max_parallel)
 
-                page = context.pages[0] if context.pages else await context.new_page()
+        semaphore = asyncio.Semaphore(max_parallel)
+        state_path = str(self.state_path)
 
+        async def post_in_context(item):
+            async with semaphore:
                 try:
-                    # Facebook megnyitása
-                    await page.goto('https://www.facebook.com', wait_until='domcontentloaded')
-                    await page.wait_for_timeout(3000)
-
-                    # Login ellenőrzés
-                    login_indicators = [
-                        'div[aria-label*="Create"]',
-                        'div[aria-label*="Bejegyzés"]',
-                        'span:has-text("What\'s on your mind")',
-                        'span:has-text("Mi jár a fejedben")',
-                    ]
-
-                    is_logged_in = False
-                    for selector in login_indicators:
-                        if await page.locator(selector).count() > 0:
-                            is_logged_in = True
-                            break
-
-                    if not is_logged_in:
-                        return {
-                            'success': False,
-                            'message': 'Nincs bejelentkezve Facebook! Jelentkezz be egyszer Firefoxban.'
-                        }
+                    context = await self._new_context(state_path)
+                except Exception as e:
+                    return {'success': False, 'message': f'Hiba: {str(e)}'}
+                try:
+                    page = await context.new_page()
+                    return await self._publish(page, item['post_content'],
+                                               item.get('image_path'), item.get('comment_text'))
+                finally:
+                    await context.close()
 
-                    # "Create post" gomb megnyomása
-                    create_selectors = [
-                        'div[aria-label="Create a post"]',
-                        'div[aria-label="Bejegyzés létrehozása"]',
-                    ]
+        return await asyncio.gather(*(post_in_context(item) for item in items))
 
-                    clicked = False
-                    for selector in create_selectors:
-                        try:
-                            element = page.locator(selector).first
-                            if await element.count() > 0:
-                                await element.click(timeout=5000)
-                                clicked = True
-                                break
-                        except Exception:
-                            continue
-
-                    if not clicked:
-                        return {
-                            'success': False,
-                            'message': 'Nem sikerült megnyitni a poszt dialógot'
-                        }
+    async def _publish(self, page, post_text: str, image_path: str = None, comment_text: str = None):
+        """Fill in and submit one post on an already open page (returns the post() result dict)"""
+        try:
+            # Facebook megnyitása
+            await page.goto('https://www.facebook.com', wait_until='domcontentloaded')
 
-                    await page.wait_for_timeout(3000)
+            # Login ellenőrzés: bármelyik jelző megjelenésére várunk, egyetlen lekérdezéssel
+            login_indicators = page.locator(_LOGIN_INDICATORS).first
 
-                    # ELŐSZÖR: Szöveg beírása (az eredeti poszt ablakban!)
-                    print("   📝 Szöveg írása ELŐSZÖR...")
-                    textarea_selectors = [
-                        'div[contenteditable="true"]',
-                        'div[aria-label*="mind"]',
-                        'div[aria-label*="fejedben"]',
-                        'div[role="textbox"]',
-                    ]
+            try:
+                await login_indicators.wait_for(state='visible', timeout=15000)
+            except PlaywrightTimeoutError:
+                return {
+                    'success': False,
+                    'message': NOT_LOGGED_IN_MESSAGE
+                }
 
-                    text_written = False
-                    for selector in textarea_selectors:
-                        try:
-                            element = page.locator(selector).first
-                            if await element.count() > 0:
-                                # Simpl click (no force), várok hogy elérhető legyen
-                                await element.click(timeout=10000)
-                                await page.wait_for_timeout(500)
-
-                                # Type
-                                await element.type(post_text, delay=50)
-
-                                text_written = True
-                                print("   ✅ Szöveg beírva!")
-                                break
-                        except Exception as e:
-                            print(f"      ⚠️  {selector} hiba: {e}")
-                            continue
-
-                    if not text_written:
-                        return {
-                            'success': False,
-                            'message': 'Nem sikerült beírni a szöveget'
-                        }
+            # "Create post" gomb megnyomása
+            create_button = page.locator(_CREATE_SELECTORS).first
 
-                    await page.wait_for_timeout(1000)
+            try:
+                await create_button.click(timeout=5000)
+            except Exception:
+                return {
+                    'success': False,
+                    'message': 'Nem sikerült megnyitni a poszt dialógot'
+                }
 
-                    # MÁSODSZOR: Kép feltöltés (UGYANABBAN az ablakban!)
-                    if image_path and os.path.exists(image_path):
-                        try:
-                            print("   📸 Kép feltöltése MÁSODSZOR...")
-
-                            # KRITIKUS: Meg KELL találnunk a Fotó/Videó gombot!
-                            # Ha direkt file input-ot használunk, új ablak nyílik!
-
-                            # Screenshot a debugging-hez
-                            await page.screenshot(path="/tmp/fb_before_photo_button.png")
-                            print("   📷 Screenshot készítve: /tmp/fb_before_photo_button.png")
-
-                            # Keressük a Fotó/Videó gombot precízebben
-                            # FONTOS: NE találjuk meg az "Élő videó" gombot!
-                            photo_button_selectors = [
-                                # Aria label alapú keresés - PONTOS egyezés
-                                '[aria-label="Fotó/videó"]',
-                                '[aria-label="Photo/video"]',
-                                '[aria-label="Fényképek/videók"]',
-                                '[aria-label="Photos/videos"]',
-                                # Fotó szó kötelező, de videó nélkül NE keresse az Élő videót!
-                                '[aria-label*="Fotó"][aria-label*="videó"]',  # Both words required
-                                '[aria-label*="Photo"][aria-label*="video"]',  # Both words required
-                                # Text alapú - az "Elhelyezés a bejegyzésben" sor első gombja
-                                'div:has-text("Elhelyezés a bejegyzésben") ~ div [role="button"]',
-                                'div:has-text("Add to your post") ~ div [role="button"]',
-                            ]
-
-                            photo_button_clicked = False
-                            for selector in photo_button_selectors:
-                                try:
-                                    elements = await page.locator(selector).all()
-                                    print(f"   🔍 Próbálom: {selector} - találat: {len(elements)} db")
-
-                                    if len(elements) > 0:
-                                        # Skip if too many results (not specific enough)
-                                        if len(elements) > 10:
-                                            print(f"   ⚠️  Túl sok találat ({len(elements)}), próbálom a következőt...")
-                                            continue
-
-                                        # Próbáljuk végig az elemeket
-                                        for idx, element in enumerate(elements):
-                                            try:
-                                                print(f"   ✅ Fotó gomb jelölt #{idx+1}: {selector}")
-
-                                                # Screenshot az elem környékéről
-                                                try:
-                                                    await element.screenshot(path=f"/tmp/fb_photo_button_{idx}.png")
-                                                    print(f"   📷 Gomb screenshot: /tmp/fb_photo_button_{idx}.png")
-                                                except:
-                                                    pass
-
-                                                # JavaScript click to bypass overlay!
-                                                await element.evaluate("el => el.click()")
-                                                print(f"   ✅ Fotó gomb megnyomva (JS click)!")
-                                                photo_button_clicked = True
-                                                await page.wait_for_timeout(1000)
-                                                break
-                                            except Exception as e:
-                                                print(f"   ⚠️  Element #{idx+1} hiba: {e}")
-                                                continue
-
-                                        if photo_button_clicked:
-                                            break
-                                except Exception as e:
-                                    print(f"   ⚠️  {selector} - hiba: {e}")
-                                    continue
-
-                            if not photo_button_clicked:
-                                print("   ❌ KRITIKUS: Fotó gomb nem található!")
-                                print("   ❌ NEM használok direkt file input-ot, mert az új ablakot nyit!")
-                                return {
-                                    'success': False,
-                                    'message': 'Fotó gomb nem található - nem lehet képet feltölteni'
-                                }
-
-                            # Most hogy a Fotó gomb megnyomva, feltöltjük a képet
-                            print("   ⏳ Várakozás a file picker megjelenésére...")
-                            await page.wait_for_timeout(2000)
-
-                            # Keressük a file input-ot - lehet hogy új elem jött létre
-                            file_input_selectors = [
-                                'input[type="file"][accept*="image"]',
-                                'input[type="file"]',
-                                'input[accept*="image"]',
-                            ]
-
-                            file_input_found = False
-                            for file_sel in file_input_selectors:
-                                try:
-                                    file_inputs = await page.locator(file_sel).all()
-                                    print(f"   🔍 File input keresés: {file_sel} - {len(file_inputs)} db")
-
-                                    if len(file_inputs) > 0:
-                                        # Próbáljuk az utolsó file input-ot (legújabb)
-                                        file_input = file_inputs[-1]
-
-                                        # Set the file directly
-                                        await file_input.set_input_files(image_path)
-                                        print(f"   ✅ Kép kiválasztva: {image_path}")
-                                        file_input_found = True
-                                        break
-                                except Exception as e:
-                                    print(f"   ⚠️  File input hiba ({file_sel}): {e}")
-                                    continue
-
-                            if not file_input_found:
-                                print("   ❌ File input nem található!")
-                                return {
-                                    'success': False,
-                                    'message': 'File input nem található a Fotó gomb megnyomása után'
-                                }
-
-                            # Várunk arra, hogy megjelenjen a kép preview
-                            print("   ⏳ Várakozás a kép preview-ra...")
-                            await page.wait_for_timeout(3000)
-
-                            # Ellenőrizzük, hogy megjelent-e a kép
-                            img_selectors = [
-                                'img[src*="blob"]',
-                                'img[src*="facebook"]',
-                                'div[style*="background-image"]',
-                            ]
-
-                            image_loaded = False
-                            for img_sel in img_selectors:
-                                if await page.locator(img_sel).count() > 0:
-                                    image_loaded = True
-                                    print(f"   ✅ Kép preview megjelent!")
-                                    break
-
-                            if not image_loaded:
-                                print("   ⚠️  Kép preview nem látható, de folytatom...")
-
-                            # Extra várakozás a teljes feldolgozásra
-                            await page.wait_for_timeout(2000)
-                            print("   ✅ Kép feltöltve és feldolgozva!")
-                        except Exception as e:
-                            print(f"   ⚠️  Kép feltöltés hiba: {e}")
-                            return {
-                                'success': False,
-                                'message': f'Kép feltöltés hiba: {str(e)}'
-                            }
-
-                    # "Post" gomb megnyomása - több selector
-                    post_button_selectors = [
-                        'div[aria-label="Post"]',
-                        'div[aria-label="Közzététel"]',
-                        'div[aria-label="Publish"]',
-                        'span:has-text("Közzététel")',
-                        'span:has-text("Post")',
-                        'div[role="button"]:has-text("Közzététel")',
-                        'div[role="button"]:has-text("Post")',
-                    ]
-
-                    posted = False
-                    for selector in post_button_selectors:
-                        try:
-                            print(f"   🔍 Próbálom: {selector}")
-                            element = page.locator(selector).first
-                            if await element.count() > 0:
-                                print(f"   ✅ Megtalálva! JavaScript click...")
-                                # Use JavaScript click to bypass overlay
-                                await element.evaluate("el => el.click()")
-                                posted = True
-                                print(f"   ✅ Publish gomb megnyomva!")
-                                break
-                        except Exception as e:
-                            print(f"   ⚠️  {selector} - hiba: {e}")
-                            continue
-
-                    if not posted:
-                        print(f"   ❌ Egyik selector sem működött!")
+            # A poszt szerkesztő dialógus - a további elemeket ezen belül keressük,
+            # így a feed azonos aria-label-ű elemei nem zavarnak be
+            dialog = page.locator(_DIALOG_SELECTOR)
+
+            # ELŐSZÖR: Szöveg beírása (az eredeti poszt ablakban!)
+            logger.info("📝 Szöveg írása ELŐSZÖR...")
+            textarea = dialog.locator(_TEXTAREA_SELECTORS).first
+
+            try:
+                await textarea.click(timeout=10000)
+                await _insert_text(page, textarea, post_text)
+                logger.info("✅ Szöveg beírva!")
+            except Exception as e:
+                logger.warning("❌ Szövegmező hiba: %s", e)
+                return {
+                    'success': False,
+                    'message': 'Nem sikerült beírni a szöveget'
+                }
+
+            # MÁSODSZOR: Kép feltöltés (UGYANABBAN az ablakban!)
+            if image_path and os.path.exists(image_path):
+                try:
+                    logger.info("📸 Kép feltöltése MÁSODSZOR...")
+
+                    # Screenshot a debugging-hez
+                    if self.debug:
+                        await page.screenshot(path="/tmp/fb_before_photo_button.png")
+                        logger.debug("Screenshot készítve: /tmp/fb_before_photo_button.png")
+
+                    photo_button = dialog.locator(_PHOTO_BUTTON_SELECTORS).first
+
+                    # A gomb által nyitott file chooser-t Playwright elkapja - nem kell a
+                    # dinamikusan létrejövő input[type=file]-t keresni (ami új ablakot nyitna)
+                    try:
+                        async with page.expect_file_chooser(timeout=10000) as chooser_info:
+                            await photo_button.click(timeout=5000)
+                        chooser = await chooser_info.value
+                    except PlaywrightTimeoutError as e:
+                        logger.warning("❌ KRITIKUS: Fotó gomb / file chooser nem található! (%s)", e)
                         return {
                             'success': False,
-                            'message': 'Nem sikerült publikálni a posztot'
+                            'message': 'Fotó gomb nem található - nem lehet képet feltölteni'
                         }
 
-                    # Várunk 5 másodpercet, hogy a poszt megjelenjen
-                    await page.wait_for_timeout(5000)
-
-                    # Ha van comment_text, kommenteljünk
-                    if comment_text:
-                        try:
-                            print(f"💬 Komment írása: {comment_text}")
-
-                            # Extra várakozás, hogy a poszt betöltődjön
-                            await page.wait_for_timeout(3000)
-
-                            # Scroll to top to see the new post
-                            await page.evaluate("window.scrollTo(0, 0)")
-                            await page.wait_for_timeout(1000)
-
-                            # Próbáljuk megnyitni a komment boxot a "Hozzászólás" gombbal
-                            comment_button_selectors = [
-                                'div[aria-label="Hozzászólás"]',
-                                'div[aria-label="Comment"]',
-                                'span:has-text("Hozzászólás")',
-                            ]
-
-                            for selector in comment_button_selectors:
-                                try:
-                                    button = page.locator(selector).first
-                                    if await button.count() > 0:
-                                        await button.click()
-                                        await page.wait_for_timeout(1000)
-                                        print(f"   ✅ Komment gomb megnyomva")
-                                        break
-                                except Exception:
-                                    continue
-
-                            # Komment box keresése - több selector
-                            comment_selectors = [
-                                'div[aria-label="Írj hozzászólást..."]',
-                                'div[aria-label*="Írj"]',
-                                'div[aria-label*="Write a comment"]',
-                                'div[aria-label*="hozzászólás"]',
-                                'div[contenteditable="true"][data-lexical-editor="true"]',
-                                'div[contenteditable="true"][role="textbox"]',
-                            ]
-
-                            commented = False
-                            for selector in comment_selectors:
-                                try:
-                                    element = page.locator(selector).first
-                                    if await element.count() > 0:
-                                        print(f"   ✅ Komment box megtalálva: {selector}")
-                                        await element.click()
-                                        await page.wait_for_timeout(800)
-
-                                        # Írjuk be a komment szöveget
-                                        await element.type(comment_text, delay=50)
-                                        await page.wait_for_timeout(800)
-                                        print(f"   ✅ Komment szöveg beírva: {comment_text}")
-
-                                        # Enter megnyomása a küldéshez
-                                        await page.keyboard.press('Enter')
-                                        print(f"   ⏳ Várakozás a komment küldésére...")
-                                        await page.wait_for_timeout(3000)
-
-                                        # Ellenőrizzük, hogy a komment megjelent-e
-                                        comment_check_selectors = [
-                                            f'span:has-text("{comment_text[:20]}")',  # First 20 chars
-                                            'div[role="article"]',
-                                        ]
-
-                                        comment_posted = False
-                                        for check_sel in comment_check_selectors:
-                                            if await page.locator(check_sel).count() > 1:  # More than 1 means comment appeared
-                                                comment_posted = True
-                                                break
-
-                                        if comment_posted:
-                                            commented = True
-                                            print(f"   ✅ Komment sikeresen posztolva!")
-                                        else:
-                                            print(f"   ⚠️  Komment lehet hogy nem lett elküldve")
-                                            commented = True  # Continue anyway
-                                        break
-                                except Exception as e:
-                                    print(f"   ⚠️  {selector} - hiba: {e}")
-                                    continue
-
-                            if not commented:
-                                print(f"   ⚠️  Nem sikerült kommentelni (nem kritikus)")
-
-                        except Exception as e:
-                            print(f"   ⚠️  Komment hiba: {e}")
-
-                    # Screenshot
-                    screenshot_path = f"/tmp/fb_post_{int(asyncio.get_event_loop().time())}.png"
-                    await page.screenshot(path=screenshot_path)
+                    await chooser.set_files(image_path)
+                    logger.info("✅ Kép kiválasztva: %s", image_path)
 
-                    return {
-                        'success': True,
-                        'message': 'Poszt sikeresen publikálva!',
-                        'screenshot': screenshot_path
-                    }
+                    # Várunk arra, hogy megjelenjen a kép preview
+                    logger.info("⏳ Várakozás a kép preview-ra...")
+                    if await _wait_for(page, _IMG_PREVIEW_SELECTOR, 10000):
+                        logger.info("✅ Kép preview megjelent!")
+                    else:
+                        logger.debug("⚠️  Kép preview nem látható, de folytatom...")
 
+                    # Feltöltés közben a Közzététel gomb le van tiltva
+                    await _wait_for(page, _POST_BUTTON_ENABLED, 15000)
+                    logger.info("✅ Kép feltöltve és feldolgozva!")
                 except Exception as e:
+                    logger.warning("❌ Kép feltöltés hiba: %s", e)
                     return {
                         'success': False,
-                        'message': f'Hiba: {str(e)}'
+                        'message': f'Kép feltöltés hiba: {str(e)}'
                     }
 
-                finally:
-                    # Cleanup
-                    await page.wait_for_timeout(3000)
-                    await context.close()
+            # "Post" gomb megnyomása - aria-label vagy a gomb felirata alapján
+            post_button = dialog.locator(_POST_BUTTON_SELECTORS).or_(
+                dialog.get_by_role('button', name='Post', exact=True)
+            ).or_(
+                dialog.get_by_role('button', name='Közzététel', exact=True)
+            ).first
 
-        finally:
-            # Temp profil törlése
             try:
-                shutil.rmtree(profile_dir)
-            except Exception:
-                pass
+                await post_button.wait_for(state='visible', timeout=5000)
+                # Use JavaScript click to bypass overlay
+                await post_button.evaluate("el => el.click()")
+                logger.info("✅ Publish gomb megnyomva!")
+            except Exception as e:
+                logger.warning("❌ Publish gomb nem található: %s", e)
+                return {
+                    'success': False,
+                    'message': 'Nem sikerült publikálni a posztot'
+                }
+
+            # Megvárjuk, hogy a poszt dialógus bezáródjon (a poszt elküldve)
+            await _wait_for(page, _DIALOG_EDITOR_SELECTOR, 15000, state='detached')
+
+            # Ha van comment_text, kommenteljünk
+            if comment_text:
+                try:
+                    logger.info("💬 Komment írása: %s", comment_text)
+
+                    # Scroll to top to see the new post
+                    await page.evaluate("window.scrollTo(0, 0)")
+
+                    # Próbáljuk megnyitni a komment boxot a "Hozzászólás" gombbal
+                    comment_button = page.locator(_COMMENT_BUTTON_SELECTORS).first
+
+                    try:
+                        await comment_button.click(timeout=2000)
+                        logger.info("✅ Komment gomb megnyomva")
+                    except PlaywrightTimeoutError:
+                        pass  # A komment box gomb nélkül is látszhat
+
+                    # Komment box keresése - bármelyik ismert változat
+                    comment_box = page.locator(_COMMENT_SELECTORS).first
+
+                    try:
+                        await comment_box.click(timeout=5000)
+                        logger.info("✅ Komment box megtalálva")
+
+                        # Írjuk be a komment szöveget
+                        await _insert_text(page, comment_box, comment_text)
+                        logger.info("✅ Komment szöveg beírva: %s", comment_text)
+
+                        # Enter megnyomása a küldéshez
+                        await page.keyboard.press('Enter')
+                        logger.info("⏳ Várakozás a komment küldésére...")
+
+                        # Megvárjuk, hogy a komment (első 20 karaktere) megjelenjen egy hozzászólásban
+                        posted_comment = page.locator(
+                            'div[role="article"] span', has_text=comment_text[:20]
+                        ).first
+                        try:
+                            await posted_comment.wait_for(state='attached', timeout=5000)
+                            logger.info("✅ Komment sikeresen posztolva!")
+                        except PlaywrightTimeoutError:
+                            logger.debug("⚠️  Komment lehet hogy nem lett elküldve")
+                    except Exception as e:
+                        logger.debug("⚠️  Nem sikerült kommentelni (nem kritikus): %s", e)
+
+                except Exception as e:
+                    logger.debug("⚠️  Komment hiba: %s", e)
+
+            # Screenshot (csak debug módban)
+            screenshot_path = None
+            if self.debug:
+                screenshot_path = f"/tmp/fb_post_{time.monotonic_ns()}.png"
+                await page.screenshot(path=screenshot_path)
+
+            return {
+                'success': True,
+                'message': 'Poszt sikeresen publikálva!',
+                'screenshot': screenshot_path
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Hiba: {str(e)}'
+            }
 
 
 async def publish_to_facebook(post_content: str, image_path: str = None, comment_text: str = None):
@@ -490,9 +582,8 @@ async def publish_to_facebook(post_content: str, image_path: str = None, comment
         dict: {'success': bool, 'message': str}
     """
     try:
-        poster = FacebookPoster()
-        result = await poster.post(post_content, image_path, comment_text)
-        return result
+        # Egyszeri session - a post() előbb a cookie-kat ellenőrzi, csak utána indít Firefoxot
+        return await FacebookPoster().post(post_content, image_path, comment_text)
     except Exception as e:
         return {
             'success': False,
@@ -500,7 +591,35 @@ async def publish_to_facebook(post_content: str, image_path: str = None, comment
         }
 
 
-# Sync wrapper for use in non-async contexts
+async def publish_many_to_facebook(items: list, max_parallel: int = MAX_PARALLEL_POSTS):
+    """
+    Több poszt publikálása egy Firefox-szal, párhuzamos context-ekben
+
+    Args:
+        items: [{'post_content': str, 'image_path': str?, 'comment_text': str?}, ...]
+        max_parallel: Egyszerre futó posztolások száma
+
+    Returns:
+        list: [{'success': bool, 'message': str}, ...] az items sorrendjében
+    """
+    try:
+        return await FacebookPoster().post_many(items, max_parallel)
+    except Exception as e:
+        return [{
+            'success': False,
+            'message': f'Facebook poster hiba: {str(e)}'
+        } for _ in items]
+
+
+_loop_thread = LoopThread('facebook-poster-loop')
+
+
+# Sync wrappers for use in non-async contexts (Flask, APScheduler)
 def publish_to_facebook_sync(post_content: str, image_path: str = None, comment_text: str = None):
     """Szinkron wrapper"""
-    return asyncio.run(publish_to_facebook(post_content, image_path, comment_text))
+    return _loop_thread.run(publish_to_facebook(post_content, image_path, comment_text))
+
+
+def publish_many_to_facebook_sync(items: list, max_parallel: int = MAX_PARALLEL_POSTS):
+    """Szinkron wrapper több poszthoz"""
+    return _loop_thread.run(publish_many_to_facebook(items, max_parallel))
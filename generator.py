@@ -2,17 +2,220 @@
 Facebook Post Generator for TrendMaster
 Uses OpenAI API to generate engaging Facebook posts
 """
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError
+import asyncio
+import httpx
+import logging
+import orjson
 import os
-from typing import List, Dict, Optional
+import re
+import requests
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from async_utils import LoopThread, RateLimiter
+from post_cache import exact_key, get_exact_cache, get_semantic_cache, to_unit_vector
 
 # Load environment variables
 load_dotenv()
 
+# Child of app.py's 'trendmaster' logger - records go through its queue listener
+logger = logging.getLogger("trendmaster.gen")
+
 # GPT-5 models (latest generation)
 OPENAI_MODEL = 'gpt-5-mini'  # Primary model for post generation
 OPENAI_TEXT_MODEL = 'gpt-5-mini'  # Model for text generation
+OPENAI_EMBEDDING_MODEL = 'text-embedding-3-small'  # Semantic post cache keys
+
+# Max in-flight OpenAI requests in generate_posts_batch
+BATCH_CONCURRENCY = 10
+
+# Trends sent together in one multi-trend chat completion
+MULTI_TREND_CHUNK = 5
+
+# Local throttle for the async chat calls - set these to the account's limits
+OPENAI_RPM = int(os.getenv('OPENAI_RPM', '500'))
+OPENAI_TPM = int(os.getenv('OPENAI_TPM', '200000'))
+
+# Connection pool of the async client - the SDK default is tuned for one call at a time
+ASYNC_HTTP_LIMITS = httpx.Limits(
+    max_connections=64,
+    max_keepalive_connections=32,
+    keepalive_expiry=60
+)
+
+
+# Facebook post prompt - built once; only the placeholders change per call.
+# All per-trend data sits at the very end of the user message so the system
+# prompt + static rules form an identical prefix for OpenAI's prompt cache.
+# ALWAYS generate in Hungarian (for Hungarian government official)
+_SYS_PROMPT = """Te egy szakértő közösségi média menedzser vagy, aki kormánybiztosok számára készít professzionális, de engaging Facebook posztokat.
+
+FONTOS KÖVETELMÉNYEK:
+• Érted a Facebook ALGORITMUSÁT és tudod, hogyan kell olyan tartalmat készíteni, ami tetszik mind az ALGORITMUSNAK, mind a KÖZÖNSÉGNEK
+• Használj TÖBB EMOJIT, mivel ez Facebook poszt - az emojik növelik az engagement-et
+• A poszt szakmailag hiteles maradjon, de legyen érdekes és figyelemfelkeltő
+• MINDEN posztot KÖTELEZŐEN ezzel a mondattal fejezd be: "link a kommentben"
+
+STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figyelmet és az olvashatóságot."""
+
+_POST_RULES = """
+Készíts 3 különböző Facebook posztot a prompt végén megadott trending témáról.
+
+⚠️ KÖTELEZŐ: Használd fel a lent megadott RÉSZLETES TARTALOM információit a poszt megírásához! Ne csak a címre hagyatkozz!
+
+⚠️ FONTOS: A posztokat MINDIG MAGYAR NYELVEN írd, még akkor is, ha a téma angol nyelvű!
+Ha a téma angol, fordítsd le a tartalmat magyarra, de úgy, hogy érthető és természetes legyen.
+
+KÖVETELMÉNYEK (KÖTELEZŐ):
+
+1. **CÉLKÖZÖNSÉG**: Kormánybiztosnak szánt tartalom
+   - Professzionális, de barátságos hangnem
+   - Humoros, de méltóságteljes
+   - Informatív és lényegre törő
+   - Szakmai hitelességet sugall
+
+2. **FACEBOOK ALGORITMUS BARÁT ELEMEK**:
+   - Használj 2-3 jól megválasztott emojit (nem túl sok!)
+   - Alkalmazz **vastag betűs** kiemeléseket a lényeges pontoknál
+   - Használj különleges karaktereket mértékkel (✓, →, •)
+   - Kérdéseket vagy felkiáltásokat a bevonzásért
+
+3. **SZERKEZET**:
+   - Figyelemfelkeltő első mondat (hook)
+   - 3-4 informatív mondatban részletesen fejtsd ki a témát
+   - Kontextus: miért fontos ez most, milyen hatásai vannak
+   - Érzelmi kapcsolódási pont vagy perspektíva
+   - Gondolatébresztő lezárás vagy kérdés
+
+4. **HOSSZ ÉS STÍLUS**:
+   - 500-800 karakter összesen (részletesebb, informatívabb, tartalmas)
+   - Jól strukturált, koherens mondatok
+   - Könnyen olvasható, de tartalmas
+   - Húzónevek/kulcsszavak kiemelése
+   - Releváns részletek, adatok, összefüggések bemutatása
+   - Legyen elég hosszú ahhoz, hogy értékes információt adjon!
+
+5. **POLITIKAI TARTALOM**: MEGENGEDETT
+   - Objektív, tényszerű megközelítés
+   - Kiegyensúlyozott álláspont
+   - Több nézőpont bemutatása
+
+6. **HÁROM KÜLÖNBÖZŐ STÍLUS**:
+   - **1. poszt**: Informatív, profi, tényközpontú
+   - **2. poszt**: Humoros, közérthető, relatable
+   - **3. poszt**: Gondolatébresztő, elemző, stratégiai
+
+FONTOS:
+- NE használj hashtag-eket (#)
+- NE írj link placeholder-eket
+- NE használj túl sok emojit (max 3 összesen)
+- NE legyél túl formális vagy unalmas
+"""
+
+_USER_TEMPLATE = _POST_RULES + """
+VÁLASZ FORMÁTUM (PONTOSAN ÍGY):
+---POST1---
+[első poszt szövege]
+---POST2---
+[második poszt szövege]
+---POST3---
+[harmadik poszt szövege]
+
+--- BEMENET ---
+TÉMA: {topic}
+FORRÁS: {source}
+
+RÉSZLETES TARTALOM (HASZNÁLD EZT A POSZT MEGÍRÁSÁHOZ!):
+{metadata}
+
+{rag_context}
+"""
+
+# Several trends in one completion: the static rules stay the shared prefix,
+# every trend gets its own numbered input block at the end
+_MULTI_USER_TEMPLATE = _POST_RULES + """
+TÖBB TÉMA: a prompt végén több téma szerepel (=== TREND n === blokkokban).
+MINDEGYIK témához külön készíts 3 posztot a fenti követelmények szerint!
+
+VÁLASZ FORMÁTUM (PONTOSAN ÍGY, minden témára a sorszámával):
+---TREND1---
+---POST1---
+[első poszt szövege]
+---POST2---
+[második poszt szövege]
+---POST3---
+[harmadik poszt szövege]
+---TREND2---
+---POST1---
+...
+
+--- BEMENET ---
+{trends}"""
+
+_MULTI_TREND_BLOCK = """=== TREND {n} ===
+TÉMA: {topic}
+FORRÁS: {source}
+
+RÉSZLETES TARTALOM (HASZNÁLD EZT A POSZT MEGÍRÁSÁHOZ!):
+{metadata}
+
+{rag_context}
+"""
+
+# post -> image prompt is stable, so it is cached far longer than posts
+IMAGE_PROMPT_TTL = 7 * 24 * 3600
+
+# Fallback post templates ({} = topic), built once instead of per call
+_NO_API_FALLBACK = ("❌ OpenAI API nem elérhető\n\nTéma: {}",) * 3
+_ERROR_FALLBACK = (
+    "📊 **{}**\n\nEz a téma most a figyelem középpontjában! Érdemes figyelni.",
+    "🔥 {}\n\nAz emberek ezt keresik most! Mit gondolsz, miért lehet ennyire aktuális?",
+    "💡 **Trending most**: {}\n\nÉrdekes kérdés, hogy ez hogyan hat a jövőre."
+)
+_FILLER_POST = "📢 {}\n\nEz a téma most felkapott! Mit gondolsz róla?"
+_NO_API_TEXT = "❌ OpenAI API nem elérhető"
+
+# One ---TRENDn--- block of a multi-trend answer (number, body)
+_TREND_RE = re.compile(r'---TREND(\d+)---\s*(.*?)(?=---TREND\d+---|\Z)', re.DOTALL)
+
+# One ---POSTn--- block of the answer (number, body)
+_POST_RE = re.compile(r'---POST([123])---\s*(.*?)\s*(?=---POST[123]---|\Z)', re.DOTALL)
+
+
+# After a failed RAG store load, try again this many seconds later
+RAG_STORE_RETRY_DELAY = 60.0
+
+_rag_store = None  # resolved on first use
+_rag_store_retry_at = 0.0
+_rag_store_lock = threading.Lock()
+
+
+def _get_rag_store():
+    """The shared RAG store, or None if chromadb / the store can't be loaded (yet)"""
+    global _rag_store, _rag_store_retry_at
+    with _rag_store_lock:
+        if _rag_store is None and time.monotonic() >= _rag_store_retry_at:
+            try:
+                from rag_store import get_rag_store
+                _rag_store = get_rag_store()
+            except Exception as e:
+                logger.warning("⚠️ RAG store not available: %s", e)
+                _rag_store_retry_at = time.monotonic() + RAG_STORE_RETRY_DELAY
+    return _rag_store
+
+
+# Memoized style contexts per normalized topic (LRU, cleared on style changes)
+RAG_CONTEXT_CACHE_SIZE = 1024
+_rag_contexts: "OrderedDict[str, str]" = OrderedDict()
+_rag_contexts_lock = threading.Lock()
 
 
 def get_rag_style_context(topic: str) -> str:
@@ -20,33 +223,159 @@ def get_rag_style_context(topic: str) -> str:
     Get RAG style context for a given topic.
     Returns empty string if RAG store is not available or has no data.
     """
+    return get_rag_style_contexts([topic])[0]
+
+
+def get_rag_style_contexts(topics: List[str]) -> List[str]:
+    """
+    Style context for each topic, in order.
+    The same story shows up from several sources, so contexts are memoized
+    per topic; the misses are embedded and queried in one batch.
+    """
+    keys = [topic.strip().lower() for topic in topics]
+    rag_store = _get_rag_store()
+    if not rag_store:
+        return [""] * len(keys)
+
+    found = {}
+    with _rag_contexts_lock:
+        for key in keys:
+            if key in _rag_contexts:
+                _rag_contexts.move_to_end(key)
+                found[key] = _rag_contexts[key]
+
+    misses = [key for key in dict.fromkeys(keys) if key not in found]
+    if misses:
+        try:
+            contexts = rag_store.get_style_contexts(misses, max_tokens=800)
+        except Exception as e:
+            # RAG store error - silently continue without it (not memoized, retried next time)
+            return [found.get(key, "") for key in keys]
+
+        for key, context in zip(misses, contexts):
+            if context:
+                logger.info("🎭 RAG style context added (%s chars)", len(context))
+            found[key] = context
+        with _rag_contexts_lock:
+            _rag_contexts.update(zip(misses, contexts))
+            while len(_rag_contexts) > RAG_CONTEXT_CACHE_SIZE:
+                _rag_contexts.popitem(last=False)
+
+    return [found[key] for key in keys]
+
+
+def clear_rag_style_cache():
+    """
+    Forget memoized style contexts (call after style samples change).
+    Semantic cache hits ignore the style, so their posts go too - exact
+    cache keys already include the style context.
+    """
+    with _rag_contexts_lock:
+        _rag_contexts.clear()
+    get_semantic_cache().clear()
+
+
+# Sora status polling: exponential backoff between these bounds (seconds)
+VIDEO_POLL_MIN_DELAY = 1.0
+VIDEO_POLL_MAX_DELAY = 10.0
+VIDEO_POLL_BACKOFF = 1.6
+
+# Sora MP4 download: (connect, read) timeout and copy block size
+VIDEO_DOWNLOAD_TIMEOUT = (5, 300)
+VIDEO_DOWNLOAD_BLOCK = 1 << 20
+
+
+def _next_poll_delay(delay: float, progress: int, elapsed: float, retry_after: Optional[str] = None) -> float:
+    """Wait before the next Sora status check, following the job's progress"""
+    if retry_after:
+        try:
+            return max(float(retry_after), VIDEO_POLL_MIN_DELAY)
+        except ValueError:
+            pass  # HTTP-date form - fall back to our own backoff
+
+    progress = progress or 0
+    if progress > 80:
+        return VIDEO_POLL_MIN_DELAY  # almost done - check often
+    if progress < 10 and elapsed < 15:
+        return delay  # short jobs finish early, don't back off yet
+    return min(delay * VIDEO_POLL_BACKOFF, VIDEO_POLL_MAX_DELAY)
+
+
+def _make_session() -> requests.Session:
+    """Keep-alive session for the Sora REST calls (create, ~60 status polls, download)"""
+    session = requests.Session()
+    # Retry only covers idempotent methods by default, so a job is never created twice
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    return session
+
+
+_SESSION = _make_session()
+
+
+_loop_thread = LoopThread('post-generator-loop')
+
+
+def _retry_after_seconds(error: RateLimitError) -> float:
+    """Retry-After of a 429 response in seconds (1 s if the header is missing)"""
+    headers = error.response.headers if error.response is not None else {}
     try:
-        from rag_store import get_rag_store
-        rag_store = get_rag_store()
-        context = rag_store.get_style_context(topic, max_tokens=800)
-        if context:
-            print(f"🎭 RAG style context added ({len(context)} chars)")
-        return context
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        return float(headers.get('retry-after', 1))
+    except ValueError:
+        return 1.0
+
+
+_rate_limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
+
+
+def _make_clients():
+    """Create the process-wide OpenAI clients (sync + async) once"""
+    api_key = os.getenv('OPENAI_API_KEY')
+
+    if not api_key:
+        logger.warning("⚠️ OPENAI_API_KEY not found in environment")
+        return None, None
+
+    try:
+        client = OpenAI(api_key=api_key)
+        aclient = AsyncOpenAI(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(limits=ASYNC_HTTP_LIMITS)
+        )
+        logger.info("✅ OpenAI API initialized")
+        return client, aclient
     except Exception as e:
-        # RAG store not available or error - silently continue without it
-        return ""
+        logger.error("❌ OpenAI initialization failed: %s", e)
+        return None, None
+
+
+def _warm_up(client: OpenAI):
+    """Open the pooled DNS/TCP/TLS connection before the first real request"""
+    try:
+        client.models.list()
+    except Exception:
+        pass  # only a warm-up - the real call reports errors
+
+
+_CLIENT, _ACLIENT = _make_clients()
+if _CLIENT:
+    threading.Thread(target=_warm_up, args=(_CLIENT,), name='openai-warmup', daemon=True).start()
 
 
 class PostGenerator:
     def __init__(self):
-        """Initialize OpenAI client"""
-        api_key = os.getenv('OPENAI_API_KEY')
-
-        if not api_key:
-            print("⚠️ OPENAI_API_KEY not found in environment")
-            self.client = None
-        else:
-            try:
-                self.client = OpenAI(api_key=api_key)
-                print("✅ OpenAI API initialized")
-            except Exception as e:
-                print(f"❌ OpenAI initialization failed: {e}")
-                self.client = None
+        """Bind the shared OpenAI clients (one connection pool per process)"""
+        self.client = _CLIENT
+        self.aclient = _ACLIENT
+        # Raw REST calls (Sora) reuse the key read at start-up
+        self._api_key = _CLIENT.api_key if _CLIENT else None
+        self._video_headers = {"Authorization": f"Bearer {self._api_key}"} if self._api_key else {}
 
     def generate_facebook_posts(self, trend_topic: str, source: str, metadata: str = "") -> List[str]:
         """
@@ -61,147 +390,219 @@ class PostGenerator:
             List of 3 generated Facebook posts
         """
         if not self.client:
-            return [
-                f"❌ OpenAI API nem elérhető\n\nTéma: {trend_topic}",
-                f"❌ OpenAI API nem elérhető\n\nTéma: {trend_topic}",
-                f"❌ OpenAI API nem elérhető\n\nTéma: {trend_topic}"
-            ]
-
-        # ALWAYS generate in Hungarian (for Hungarian government official)
-        language = "magyar"
-
-        # Get RAG style context if available
-        rag_context = get_rag_style_context(trend_topic)
-
-        prompt = f"""
-        Készíts 3 különböző Facebook posztot a következő trending témáról.
-
-        TÉMA: {trend_topic}
-        FORRÁS: {source}
-
-        RÉSZLETES TARTALOM (HASZNÁLD EZT A POSZT MEGÍRÁSÁHOZ!):
-        {metadata}
-
-        {rag_context}
-
-        ⚠️ KÖTELEZŐ: Használd fel a fenti RÉSZLETES TARTALOM információit a poszt megírásához! Ne csak a címre hagyatkozz!
-
-        ⚠️ FONTOS: A posztokat MINDIG MAGYAR NYELVEN írd, még akkor is, ha a téma angol nyelvű!
-        Ha a téma angol, fordítsd le a tartalmat magyarra, de úgy, hogy érthető és természetes legyen.
-
-        KÖVETELMÉNYEK (KÖTELEZŐ):
-
-        1. **CÉLKÖZÖNSÉG**: Kormánybiztosnak szánt tartalom
-           - Professzionális, de barátságos hangnem
-           - Humoros, de méltóságteljes
-           - Informatív és lényegre törő
-           - Szakmai hitelességet sugall
-
-        2. **FACEBOOK ALGORITMUS BARÁT ELEMEK**:
-           - Használj 2-3 jól megválasztott emojit (nem túl sok!)
-           - Alkalmazz **vastag betűs** kiemeléseket a lényeges pontoknál
-           - Használj különleges karaktereket mértékkel (✓, →, •)
-           - Kérdéseket vagy felkiáltásokat a bevonzásért
-
-        3. **SZERKEZET**:
-           - Figyelemfelkeltő első mondat (hook)
-           - 3-4 informatív mondatban részletesen fejtsd ki a témát
-           - Kontextus: miért fontos ez most, milyen hatásai vannak
-           - Érzelmi kapcsolódási pont vagy perspektíva
-           - Gondolatébresztő lezárás vagy kérdés
-
-        4. **HOSSZ ÉS STÍLUS**:
-           - 500-800 karakter összesen (részletesebb, informatívabb, tartalmas)
-           - Jól strukturált, koherens mondatok
-           - Könnyen olvasható, de tartalmas
-           - Húzónevek/kulcsszavak kiemelése
-           - Releváns részletek, adatok, összefüggések bemutatása
-           - Legyen elég hosszú ahhoz, hogy értékes információt adjon!
-
-        5. **POLITIKAI TARTALOM**: MEGENGEDETT
-           - Objektív, tényszerű megközelítés
-           - Kiegyensúlyozott álláspont
-           - Több nézőpont bemutatása
-
-        6. **HÁROM KÜLÖNBÖZŐ STÍLUS**:
-           - **1. poszt**: Informatív, profi, tényközpontú
-           - **2. poszt**: Humoros, közérthető, relatable
-           - **3. poszt**: Gondolatébresztő, elemző, stratégiai
-
-        FONTOS:
-        - NE használj hashtag-eket (#)
-        - NE írj link placeholder-eket
-        - NE használj túl sok emojit (max 3 összesen)
-        - NE legyél túl formális vagy unalmas
-
-        VÁLASZ FORMÁTUM (PONTOSAN ÍGY):
-        ---POST1---
-        [első poszt szövege]
-        ---POST2---
-        [második poszt szövege]
-        ---POST3---
-        [harmadik poszt szövege]
-        """
+            return self._no_api_posts(trend_topic)
+
+        messages = self._post_messages(trend_topic, source, metadata, get_rag_style_context(trend_topic))
+        key = self._exact_key(messages)
+        cached = get_exact_cache().get(key)
+        if cached:
+            return cached
+
+        embedding = self._embed(trend_topic, metadata)
+        if embedding is not None:
+            cached = get_semantic_cache().lookup(embedding)
+            if cached:
+                return cached
 
         try:
             response = self.client.chat.completions.create(
                 model=OPENAI_MODEL,  # GPT-5 mini - latest generation
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Te egy szakértő közösségi média menedzser vagy, aki kormánybiztosok számára készít professzionális, de engaging Facebook posztokat.
-
-FONTOS KÖVETELMÉNYEK:
-• Érted a Facebook ALGORITMUSÁT és tudod, hogyan kell olyan tartalmat készíteni, ami tetszik mind az ALGORITMUSNAK, mind a KÖZÖNSÉGNEK
-• Használj TÖBB EMOJIT, mivel ez Facebook poszt - az emojik növelik az engagement-et
-• A poszt szakmailag hiteles maradjon, de legyen érdekes és figyelemfelkeltő
-• MINDEN posztot KÖTELEZŐEN ezzel a mondattal fejezd be: "link a kommentben"
-
-STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figyelmet és az olvashatóságot."""
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+                messages=messages,
                 # GPT-5-mini only supports default temperature (1), don't set it
                 max_completion_tokens=2000  # Enough for 3 detailed posts of 500-800 chars each
             )
+            posts, parsed = self._parse_posts(response.choices[0].message.content, trend_topic)
+            self._cache_posts(key, embedding, posts, complete=parsed == 3)
+            return posts
 
-            # Parse response
-            response_text = response.choices[0].message.content.strip()
-
-            # Extract posts
-            posts = []
-            parts = response_text.split('---POST')
-
-            for part in parts[1:]:  # Skip first empty part
-                # Extract content between --- markers
-                content = part.split('---')[1].strip() if '---' in part else part.strip()
+        except Exception as e:
+            logger.error("❌ Error generating posts: %s", e)
+            return self._fallback_posts(trend_topic)
+
+    async def _agenerate_facebook_posts(self, trend_topic: str, source: str, metadata: str = "") -> List[str]:
+        """Async variant of generate_facebook_posts on the AsyncOpenAI client"""
+        if not self.aclient:
+            return self._no_api_posts(trend_topic)
+
+        job = await self._aprepare(trend_topic, source, metadata)
+        return job['cached'] or await self._acomplete(job)
+
+    async def _aprepare(self, trend_topic: str, source: str, metadata: str,
+                        rag_context: Optional[str] = None) -> Dict:
+        """RAG context (unless prefetched), cache keys and cache lookups for one trend"""
+        if rag_context is None:
+            # The RAG lookup is blocking (ChromaDB + embedding) - keep it off the loop
+            rag_context = await asyncio.to_thread(get_rag_style_context, trend_topic)
+        messages = self._post_messages(trend_topic, source, metadata, rag_context)
+        key = self._exact_key(messages)
+        embedding = None
+
+        cached = get_exact_cache().get(key)
+        if not cached:
+            embedding = await self._aembed(trend_topic, metadata)
+            if embedding is not None:
+                cached = get_semantic_cache().lookup(embedding)
+
+        return {
+            'topic': trend_topic,
+            'source': source,
+            'metadata': metadata,
+            'rag_context': rag_context,
+            'messages': messages,
+            'key': key,
+            'embedding': embedding,
+            'cached': cached
+        }
+
+    async def _acomplete(self, job: Dict) -> List[str]:
+        """Single-trend chat completion for a prepared job"""
+        try:
+            response = await self._achat(job['messages'], max_completion_tokens=2000)
+            posts, parsed = self._parse_posts(response.choices[0].message.content, job['topic'])
+            self._cache_posts(job['key'], job['embedding'], posts, complete=parsed == 3)
+            return posts
 
-                # Clean up post
-                content = content.replace('POST1', '').replace('POST2', '').replace('POST3', '')
-                content = content.strip()
+        except Exception as e:
+            logger.error("❌ Error generating posts: %s", e)
+            return self._fallback_posts(job['topic'])
+
+    async def _achat(self, messages: List[Dict], max_completion_tokens: int):
+        """Rate-limited async chat completion"""
+        # ~4 characters per token for the prompt, plus the completion budget
+        estimated_tokens = sum(len(m['content']) for m in messages) // 4 + max_completion_tokens
+        await _rate_limiter.acquire(estimated_tokens)
+        try:
+            return await self.aclient.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_completion_tokens=max_completion_tokens
+            )
+        except RateLimitError as e:
+            # The SDK already retried - make the rest of the batch back off too
+            retry_after = _retry_after_seconds(e)
+            logger.warning("⚠️ OpenAI rate limit hit, pausing requests for %.1fs", retry_after)
+            _rate_limiter.pause(retry_after)
+            raise
+
+    @staticmethod
+    def _embedding_input(trend_topic: str, metadata: str) -> str:
+        """Text the semantic cache key is embedded from"""
+        return f"{trend_topic}\n{(metadata or '')[:1000]}"
+
+    def _embed(self, trend_topic: str, metadata: str):
+        """Unit-length embedding of the trend, or None if the call fails"""
+        try:
+            response = self.client.embeddings.create(
+                model=OPENAI_EMBEDDING_MODEL,
+                input=self._embedding_input(trend_topic, metadata)
+            )
+            return to_unit_vector(response.data[0].embedding)
+        except Exception as e:
+            logger.warning("⚠️ Embedding failed, semantic cache skipped: %s", e)
+            return None
 
-                if content:
-                    posts.append(content)
+    async def _aembed(self, trend_topic: str, metadata: str):
+        """Async variant of _embed"""
+        try:
+            response = await self.aclient.embeddings.create(
+                model=OPENAI_EMBEDDING_MODEL,
+                input=self._embedding_input(trend_topic, metadata)
+            )
+            return to_unit_vector(response.data[0].embedding)
+        except Exception as e:
+            logger.warning("⚠️ Embedding failed, semantic cache skipped: %s", e)
+            return None
 
-            # Ensure we have exactly 3 posts
-            while len(posts) < 3:
-                posts.append(f"📢 {trend_topic}\n\nEz a téma most felkapott! Mit gondolsz róla?")
+    @staticmethod
+    def _exact_key(messages: List[Dict]) -> bytes:
+        """Exact cache key: model + the full prompt (system, template, topic, RAG context)"""
+        return exact_key(OPENAI_MODEL, orjson.dumps(messages))
 
-            print(f"✅ Generated {len(posts)} Facebook posts for: {trend_topic[:50]}...")
+    @staticmethod
+    def _cache_posts(key: bytes, embedding, posts: List[str], complete: bool = True):
+        """
+        Remember generated posts for repeated and near-duplicate trends.
+        Answers padded with filler posts (complete=False) are not stored -
+        a semantic entry would hand them to every near-duplicate story.
+        """
+        if not complete:
+            return
+        try:
+            get_exact_cache().set(key, posts)
+            if embedding is not None:
+                get_semantic_cache().add(embedding, posts)
+        except Exception as e:
+            logger.warning("⚠️ Post cache write failed: %s", e)
+
+    @staticmethod
+    def _post_messages(trend_topic: str, source: str, metadata: str, rag_context: str) -> List[Dict]:
+        """Build the chat messages for the 3-post prompt"""
+        prompt = _USER_TEMPLATE.format(
+            topic=trend_topic,
+            source=source,
+            metadata=metadata,
+            rag_context=rag_context
+        )
+        return [
+            {"role": "system", "content": _SYS_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _parse_posts(response_text: str, trend_topic: str) -> Tuple[List[str], int]:
+        """
+        Split the ---POSTn--- formatted answer into exactly 3 posts.
+        Also returns how many of them really came from the model.
+        """
+        # Extract posts in one pass over the answer
+        posts = [body for _, body in _POST_RE.findall(response_text or '') if body][:3]
+        parsed = len(posts)
+
+        # Ensure we have exactly 3 posts
+        while len(posts) < 3:
+            posts.append(_FILLER_POST.format(trend_topic))
+
+        logger.info("✅ Generated %s Facebook posts for: %s...", parsed, trend_topic[:50])
+
+        return posts, parsed
+
+    @staticmethod
+    def _multi_messages(jobs: List[Dict]) -> List[Dict]:
+        """Build the chat messages for one multi-trend request"""
+        blocks = [
+            _MULTI_TREND_BLOCK.format(
+                n=n,
+                topic=job['topic'],
+                source=job['source'],
+                metadata=job['metadata'],
+                rag_context=job['rag_context']
+            )
+            for n, job in enumerate(jobs, 1)
+        ]
+        return [
+            {"role": "system", "content": _SYS_PROMPT},
+            {"role": "user", "content": _MULTI_USER_TEMPLATE.format(trends="\n".join(blocks))}
+        ]
+
+    @staticmethod
+    def _parse_multi(response_text: str) -> Dict[int, List[str]]:
+        """Trend number -> 3 posts, for every complete ---TRENDn--- block"""
+        results = {}
+        for number, body in _TREND_RE.findall(response_text or ''):
+            posts = [post for _, post in _POST_RE.findall(body) if post]
+            if len(posts) == 3:
+                results[int(number)] = posts
+        return results
 
-            return posts[:3]
+    @staticmethod
+    def _no_api_posts(trend_topic: str) -> List[str]:
+        """Placeholder posts when no OpenAI client is configured"""
+        return [template.format(trend_topic) for template in _NO_API_FALLBACK]
 
-        except Exception as e:
-            print(f"❌ Error generating posts: {e}")
-            # Fallback posts
-            return [
-                f"📊 **{trend_topic}**\n\nEz a téma most a figyelem középpontjában! Érdemes figyelni.",
-                f"🔥 {trend_topic}\n\nAz emberek ezt keresik most! Mit gondolsz, miért lehet ennyire aktuális?",
-                f"💡 **Trending most**: {trend_topic}\n\nÉrdekes kérdés, hogy ez hogyan hat a jövőre."
-            ]
+    @staticmethod
+    def _fallback_posts(trend_topic: str) -> List[str]:
+        """Generic posts used when the API call fails"""
+        return [template.format(trend_topic) for template in _ERROR_FALLBACK]
 
     def generate_text(self, prompt: str) -> str:
         """
@@ -214,10 +615,10 @@ STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figy
             Generated text string
         """
         if not self.client:
-            return "❌ OpenAI API nem elérhető"
+            return _NO_API_TEXT
 
         try:
-            print(f"📝 Generating text with {OPENAI_TEXT_MODEL}: {prompt[:50]}...")
+            logger.info("📝 Generating text with %s: %s...", OPENAI_TEXT_MODEL, prompt[:50])
 
             response = self.client.chat.completions.create(
                 model=OPENAI_TEXT_MODEL,  # GPT-5 mini
@@ -234,7 +635,7 @@ STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figy
                 return "❌ Nem sikerült szöveget generálni"
 
         except Exception as e:
-            print(f"❌ Error generating text with GPT-4: {e}")
+            logger.error("❌ Error generating text with GPT-4: %s", e)
             return f"❌ Hiba a szöveg generálás során: {str(e)}"
 
     def generate_posts_batch(self, trends: List[Dict], max_trends: int = 5) -> Dict[int, List[str]]:
@@ -248,18 +649,93 @@ STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figy
         Returns:
             Dictionary mapping trend_id to list of posts
         """
-        results = {}
+        return self.generate_facebook_posts_multi(trends[:max_trends])
+
+    def generate_facebook_posts_multi(self, trends: List[Dict]) -> Dict[Any, List[str]]:
+        """
+        Generate 3 posts for each trend, several trends per chat completion
+
+        Cached trends are answered from the post cache; the rest go out
+        MULTI_TREND_CHUNK at a time in one request, so the long static
+        prompt is paid once per chunk. Trends missing from a combined
+        answer fall back to a single-trend call.
+
+        Args:
+            trends: List of trend dictionaries (id, topic, source, metadata)
 
-        for idx, trend in enumerate(trends[:max_trends]):
-            print(f"\n🤖 Generating posts {idx+1}/{min(len(trends), max_trends)}")
+        Returns:
+            Dictionary mapping trend id to list of posts
+        """
+        return _loop_thread.run(self._agenerate_multi(trends))
+
+    async def _agenerate_multi(self, trends: List[Dict]) -> Dict[Any, List[str]]:
+        if not self.aclient:
+            return {trend.get('id'): self._no_api_posts(trend.get('topic', 'Unknown topic'))
+                    for trend in trends}
+
+        sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        # Style contexts for the whole batch: one encode() + one ChromaDB query
+        topics = [trend.get('topic', 'Unknown topic') for trend in trends]
+        rag_contexts = await asyncio.to_thread(get_rag_style_contexts, topics)
+
+        async def prepare(trend: Dict, topic: str, rag_context: str) -> Dict:
+            async with sem:
+                job = await self._aprepare(
+                    topic,
+                    trend.get('source', 'unknown'),
+                    trend.get('metadata', ''),
+                    rag_context
+                )
+            job['id'] = trend.get('id')
+            return job
+
+        jobs = await asyncio.gather(*(
+            prepare(trend, topic, rag_context)
+            for trend, topic, rag_context in zip(trends, topics, rag_contexts)
+        ))
+
+        results = {job['id']: job['cached'] for job in jobs if job['cached']}
+        misses = [job for job in jobs if not job['cached']]
+        chunks = [misses[i:i + MULTI_TREND_CHUNK] for i in range(0, len(misses), MULTI_TREND_CHUNK)]
+        for generated in await asyncio.gather(*(self._agenerate_chunk(chunk, sem) for chunk in chunks)):
+            results.update(generated)
+
+        return {job['id']: results[job['id']] for job in jobs}
+
+    async def _agenerate_chunk(self, jobs: List[Dict], sem: asyncio.Semaphore) -> Dict[Any, List[str]]:
+        """One chat completion for up to MULTI_TREND_CHUNK uncached trends"""
+        async def single(job: Dict) -> List[str]:
+            async with sem:
+                return await self._acomplete(job)
+
+        parsed = {}
+        if len(jobs) > 1:
+            logger.info("🤖 Generating posts for %s trends in one request", len(jobs))
+            try:
+                async with sem:
+                    response = await self._achat(self._multi_messages(jobs),
+                                                 max_completion_tokens=2000 * len(jobs))
+                parsed = self._parse_multi(response.choices[0].message.content)
+            except Exception as e:
+                logger.error("❌ Multi-trend generation failed: %s", e)
 
-            trend_id = trend.get('id')
-            topic = trend.get('topic', 'Unknown topic')
-            source = trend.get('source', 'unknown')
-            metadata = trend.get('metadata', '')
+        results = {}
+        retry = []
+        for n, job in enumerate(jobs, 1):
+            posts = parsed.get(n)
+            if posts:
+                logger.info("✅ Generated %s Facebook posts for: %s...", len(posts), job['topic'][:50])
+                self._cache_posts(job['key'], job['embedding'], posts)
+                results[job['id']] = posts
+            else:
+                retry.append(job)
 
-            posts = self.generate_facebook_posts(topic, source, metadata)
-            results[trend_id] = posts
+        if retry:
+            if len(jobs) > 1:
+                logger.warning("⚠️ %s trend(s) missing from the combined answer, generating one by one", len(retry))
+            for job, posts in zip(retry, await asyncio.gather(*(single(job) for job in retry))):
+                results[job['id']] = posts
 
         return results
 
@@ -276,8 +752,14 @@ STÍLUS: Professzionális, de barátságos és engaging. Emojikkal fokozd a figy
         if not self.client:
             return f"Social media visual for: {post_text[:200]}"
 
+        # Preview and publish ask for the same post - don't pay the LLM twice
+        key = exact_key('image_prompt', OPENAI_MODEL, post_text)
+        cached = get_exact_cache().get(key)
+        if cached:
+            return cached
+
         try:
-            print(f"📝 Generating image prompt from post...")
+            logger.info("📝 Generating image prompt from post...")
 
             response = self.client.chat.completions.create(
                 model=OPENAI_MODEL,
@@ -302,10 +784,12 @@ A prompt legyen:
             )
 
             prompt = response.choices[0].message.content.strip()
-            print(f"✅ Image prompt generated: {prompt[:50]}...")
+            logger.info("✅ Image prompt generated: %s...", prompt[:50])
+            if prompt:
+                get_exact_cache().set(key, prompt, ttl=IMAGE_PROMPT_TTL)
             return prompt
         except Exception as e:
-            print(f"❌ Error generating image prompt: {e}")
+            logger.error("❌ Error generating image prompt: %s", e)
             return f"Professional social media visual representing: {post_text[:100]}"
 
     def generate_image(self, prompt: str) -> str:
@@ -320,11 +804,11 @@ A prompt legyen:
         """
         if not self.client:
             # Return a placeholder if no API key
-            print("⚠️ OpenAI API not available, using placeholder image")
+            logger.warning("⚠️ OpenAI API not available, using placeholder image")
             return "https://images.unsplash.com/photo-1677442136019-21780ecad995?auto=format&fit=crop&q=80&w=1000"
 
         try:
-            print(f"🎨 Generating image with DALL-E 3 for: {prompt[:50]}...")
+            logger.info("🎨 Generating image with DALL-E 3 for: %s...", prompt[:50])
             response = self.client.images.generate(
                 model="dall-e-3",
                 prompt=f"Social media image for: {prompt}. High quality, professional, engaging style.",
@@ -333,10 +817,10 @@ A prompt legyen:
                 n=1,
             )
             image_url = response.data[0].url
-            print(f"✅ Image generated successfully")
+            logger.info("✅ Image generated successfully")
             return image_url
         except Exception as e:
-            print(f"❌ Image generation failed: {e}")
+            logger.error("❌ Image generation failed: %s", e)
             # Error fallback
             return "https://images.unsplash.com/photo-1557683316-973673baf926?auto=format&fit=crop&w=1000"
 
@@ -351,31 +835,49 @@ A prompt legyen:
         Returns:
             Path to the generated video file
         """
-        if not self.client:
-            print("⚠️ OpenAI API not available for video generation")
+        video_id = self.start_video(prompt, duration)
+        if not video_id:
             return None
+        return _loop_thread.run(self.await_video(video_id))
 
-        try:
-            import requests
-            import tempfile
-            import uuid
-            import time
+    def generate_videos(self, prompts: List[str], duration: int = 5) -> List[Optional[str]]:
+        """
+        Generate several Sora videos at once
+
+        All jobs are created first, then awaited together, so the wall time
+        is that of the slowest video instead of the sum.
 
-            print(f"🎬 Generating video with Sora 2: {prompt[:50]}...")
+        Returns:
+            Video file path (or None) per prompt, in order
+        """
+        video_ids = [self.start_video(prompt, duration) for prompt in prompts]
+
+        async def wait_all():
+            async def wait(video_id):
+                return await self.await_video(video_id) if video_id else None
+            return await asyncio.gather(*(wait(video_id) for video_id in video_ids))
+
+        return _loop_thread.run(wait_all())
+
+    def start_video(self, prompt: str, duration: int = 5) -> Optional[str]:
+        """
+        Create a Sora 2 video job and return right away
+
+        Returns:
+            The video job id, or None if the job could not be created
+        """
+        if not self._api_key:
+            logger.warning("⚠️ OpenAI API not available for video generation")
+            return None
+
+        try:
+            logger.info("🎬 Generating video with Sora 2: %s...", prompt[:50])
 
             # Map duration to allowed values
             allowed_durations = {4: "4", 5: "4", 8: "8", 12: "12"}
             seconds_str = allowed_durations.get(duration, "4")
             if duration not in [4, 5, 8, 12]:
-                print(f"⚠️ Duration {duration}s not allowed, using 4s instead")
-
-            api_key = os.getenv('OPENAI_API_KEY')
-
-            # Step 1: Create video generation job
-            create_url = "https://api.openai.com/v1/videos"
-            headers = {
-                "Authorization": f"Bearer {api_key}"
-            }
+                logger.warning("⚠️ Duration %ss not allowed, using 4s instead", duration)
 
             # Use multipart/form-data as per API docs
             files = {
@@ -385,68 +887,110 @@ A prompt legyen:
                 'size': (None, '1280x720')
             }
 
-            print(f"📤 Creating video job...")
-            create_response = requests.post(create_url, headers=headers, files=files)
+            logger.info("📤 Creating video job...")
+            create_response = _SESSION.post("https://api.openai.com/v1/videos",
+                                            headers=self._video_headers, files=files)
 
             if create_response.status_code != 200:
-                print(f"❌ Failed to create video job: {create_response.status_code}")
-                print(f"Response: {create_response.text}")
+                logger.error("❌ Failed to create video job: %s", create_response.status_code)
+                logger.error("Response: %s", create_response.text)
                 return None
 
-            job_data = create_response.json()
+            job_data = orjson.loads(create_response.content)
             video_id = job_data.get('id')
-            print(f"✅ Video job created: {video_id}")
-            print(f"   Status: {job_data.get('status')}")
+            logger.info("✅ Video job created: %s", video_id)
+            logger.info("   Status: %s", job_data.get('status'))
+            return video_id
 
-            # Step 2: Poll job status until completed
-            retrieve_url = f"https://api.openai.com/v1/videos/{video_id}"
-            max_wait_time = 300  # 5 minutes max
-            start_time = time.time()
+        except Exception as e:
+            logger.exception("❌ Sora video generation failed: %s", e)
+            return None
 
-            while time.time() - start_time < max_wait_time:
-                time.sleep(5)  # Check every 5 seconds
+    def poll_video(self, video_id: str) -> Dict:
+        """
+        Check a Sora job once, without waiting
 
-                status_response = requests.get(retrieve_url, headers=headers)
-                if status_response.status_code != 200:
-                    print(f"❌ Failed to check status: {status_response.status_code}")
-                    return None
+        Returns:
+            Dict with 'status', 'progress' and 'retry_after'; once the job is
+            completed the video is downloaded and its path is in 'path'.
+            Status is 'error' if the check or the download failed.
+        """
+        status_response = _SESSION.get(f"https://api.openai.com/v1/videos/{video_id}",
+                                       headers=self._video_headers)
+        if status_response.status_code != 200:
+            logger.error("❌ Failed to check status: %s", status_response.status_code)
+            return {'status': 'error', 'progress': 0, 'retry_after': None}
+
+        status_data = orjson.loads(status_response.content)
+        result = {
+            'status': status_data.get('status'),
+            'progress': status_data.get('progress', 0),
+            'retry_after': status_response.headers.get('Retry-After')
+        }
+        logger.info("⏳ Status: %s (%s%%)", result['status'], result['progress'])
+
+        if result['status'] == 'completed':
+            # Video is ready!
+            video_url = status_data.get('url')
+            if not video_url:
+                logger.error("❌ No video URL in response")
+                result['status'] = 'error'
+            else:
+                result['path'] = self._download_video(video_url)
+
+        return result
 
-                status_data = status_response.json()
-                current_status = status_data.get('status')
-                progress = status_data.get('progress', 0)
+    @staticmethod
+    def _download_video(video_url: str) -> str:
+        """Download a finished Sora video to a temp file"""
+        logger.info("📥 Downloading video from: %s...", video_url[:50])
 
-                print(f"⏳ Status: {current_status} ({progress}%)")
+        temp_dir = tempfile.gettempdir()
+        temp_filename = f"sora_{uuid.uuid4()}.mp4"
+        temp_path = os.path.join(temp_dir, temp_filename)
 
-                if current_status == 'completed':
-                    # Video is ready!
-                    video_url = status_data.get('url')
-                    if not video_url:
-                        print("❌ No video URL in response")
-                        return None
+        # Stream the socket straight into the file in 1 MiB blocks -
+        # no whole-MP4 bytes object, no extra copy
+        with _SESSION.get(video_url, stream=True, timeout=VIDEO_DOWNLOAD_TIMEOUT) as video_response:
+            video_response.raise_for_status()
+            video_response.raw.decode_content = True
+            with open(temp_path, 'wb', buffering=VIDEO_DOWNLOAD_BLOCK) as f:
+                shutil.copyfileobj(video_response.raw, f, length=VIDEO_DOWNLOAD_BLOCK)
 
-                    # Step 3: Download video
-                    print(f"📥 Downloading video from: {video_url[:50]}...")
+        logger.info("✅ Video generated successfully with Sora 2")
+        return temp_path
 
-                    temp_dir = tempfile.gettempdir()
-                    temp_filename = f"sora_{uuid.uuid4()}.mp4"
-                    temp_path = os.path.join(temp_dir, temp_filename)
+    async def await_video(self, video_id: str, max_wait_time: int = 300) -> Optional[str]:
+        """
+        Wait for a Sora job with backoff polling, without holding a thread
+
+        Returns:
+            Path to the downloaded video, or None on failure / timeout
+        """
+        start_time = time.time()
+        delay = VIDEO_POLL_MIN_DELAY
 
-                    video_response = requests.get(video_url)
-                    with open(temp_path, 'wb') as f:
-                        f.write(video_response.content)
+        try:
+            while time.time() - start_time < max_wait_time:
+                await asyncio.sleep(delay)
 
-                    print(f"✅ Video generated successfully with Sora 2")
-                    return temp_path
+                # requests is blocking - run the single check in a worker thread
+                result = await asyncio.to_thread(self.poll_video, video_id)
 
-                elif current_status == 'failed':
-                    print(f"❌ Video generation failed")
+                if result['status'] == 'completed':
+                    return result['path']
+                if result['status'] == 'failed':
+                    logger.error("❌ Video generation failed")
                     return None
+                if result['status'] == 'error':
+                    return None
+
+                delay = _next_poll_delay(delay, result['progress'], time.time() - start_time,
+                                         result['retry_after'])
 
-            print(f"❌ Video generation timed out after {max_wait_time}s")
+            logger.error("❌ Video generation timed out after %ss", max_wait_time)
             return None
 
         except Exception as e:
-            print(f"❌ Sora video generation failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Sora video generation failed: %s", e)
             return None
@@ -5,14 +5,57 @@ Uses Gemini 3, Nano Banana Pro (Gemini 3 Pro Image), and Veo 3.1 (Video) APIs
 import google.generativeai as genai
 from google import genai as genai_new  # New SDK for image and video generation
 from google.genai import types as genai_types
+import asyncio
+import httpx
 import os
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
+from async_utils import LoopThread, RateLimiter
 import time
 
 # Load environment variables
 load_dotenv()
 
+POST_GENERATION_CONFIG = {
+    'temperature': 0.8,
+    'max_output_tokens': 800,
+}
+
+# Max in-flight Gemini calls in generate_posts_batch
+GEMINI_BATCH_CONCURRENCY = 5
+
+# Requests per minute allowed to the Gemini text model
+GEMINI_QPM = int(os.getenv('GEMINI_QPM', '60'))
+
+
+_loop_thread = LoopThread('google-ai-loop')
+
+
+_qpm_limiter = RateLimiter(GEMINI_QPM)
+
+# Veo operation polling: exponential backoff between these bounds (seconds)
+VIDEO_POLL_MIN_DELAY = 2.0
+VIDEO_POLL_MAX_DELAY = 20.0
+VIDEO_POLL_BACKOFF = 1.5
+VIDEO_MAX_WAIT = 360  # 6 minutes max
+
+# Connection pool shared by the google.genai sync and async httpx clients
+GENAI_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30)
+
+
+def _make_new_client(api_key: str):
+    """google.genai client whose httpx clients keep a pooled, kept-alive connection set"""
+    try:
+        http_options = genai_types.HttpOptions(
+            client_args={'limits': GENAI_HTTP_LIMITS},
+            async_client_args={'limits': GENAI_HTTP_LIMITS}
+        )
+        return genai_new.Client(api_key=api_key, http_options=http_options)
+    except Exception as e:
+        # Older google-genai without client_args - default pooling
+        print(f"⚠️ Custom genai HTTP options not supported ({e}), using defaults")
+        return genai_new.Client(api_key=api_key)
+
 
 class GoogleAIGenerator:
     def __init__(self):
@@ -35,8 +78,9 @@ class GoogleAIGenerator:
                 # Test connection with Gemini 3 (old API for text)
                 self.text_model = genai.GenerativeModel(self.text_model_name)
 
-                # Initialize new client for image/video (Nano Banana, Veo)
-                self.new_client = genai_new.Client(api_key=api_key)
+                # Initialize new client for image/video (Nano Banana, Veo) -
+                # one client, one pooled connection set for every call
+                self.new_client = _make_new_client(api_key)
 
                 print("✅ Google AI API initialized")
                 print(f"   • Text: {self.text_model_name}")
@@ -60,12 +104,39 @@ class GoogleAIGenerator:
             List of 3 generated Facebook posts
         """
         if not hasattr(self, 'text_model'):
-            return [
-                f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}",
-                f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}",
-                f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}"
-            ]
+            return self._no_api_posts(trend_topic)
+
+        try:
+            response = self.text_model.generate_content(
+                self._post_prompt(trend_topic, source, metadata),
+                generation_config=POST_GENERATION_CONFIG
+            )
+            return self._parse_posts(response.text, trend_topic)
 
+        except Exception as e:
+            print(f"❌ Error generating posts with Gemini 3: {e}")
+            return self._fallback_posts(trend_topic)
+
+    async def _agenerate_facebook_posts(self, trend_topic: str, source: str, metadata: str = "") -> List[str]:
+        """Async variant of generate_facebook_posts (generate_content_async)"""
+        if not hasattr(self, 'text_model'):
+            return self._no_api_posts(trend_topic)
+
+        try:
+            await _qpm_limiter.acquire()
+            response = await self.text_model.generate_content_async(
+                self._post_prompt(trend_topic, source, metadata),
+                generation_config=POST_GENERATION_CONFIG
+            )
+            return self._parse_posts(response.text, trend_topic)
+
+        except Exception as e:
+            print(f"❌ Error generating posts with Gemini 3: {e}")
+            return self._fallback_posts(trend_topic)
+
+    @staticmethod
+    def _post_prompt(trend_topic: str, source: str, metadata: str) -> str:
+        """Build the 3-post prompt for a trend"""
         prompt = f"""
         Készíts 3 különböző Facebook posztot a következő trending témáról.
 
@@ -129,49 +200,53 @@ class GoogleAIGenerator:
         [harmadik poszt szövege]
         """
 
-        try:
-            response = self.text_model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.8,
-                    'max_output_tokens': 800,
-                }
-            )
+        return prompt
 
-            # Parse response
-            response_text = response.text.strip()
+    @staticmethod
+    def _parse_posts(response_text: str, trend_topic: str) -> List[str]:
+        """Split the ---POSTn--- formatted answer into exactly 3 posts"""
+        response_text = response_text.strip()
 
-            # Extract posts
-            posts = []
-            parts = response_text.split('---POST')
+        # Extract posts
+        posts = []
+        parts = response_text.split('---POST')
 
-            for part in parts[1:]:  # Skip first empty part
-                # Extract content between --- markers
-                content = part.split('---')[1].strip() if '---' in part else part.strip()
+        for part in parts[1:]:  # Skip first empty part
+            # Extract content between --- markers
+            content = part.split('---')[1].strip() if '---' in part else part.strip()
 
-                # Clean up post
-                content = content.replace('POST1', '').replace('POST2', '').replace('POST3', '')
-                content = content.strip()
+            # Clean up post
+            content = content.replace('POST1', '').replace('POST2', '').replace('POST3', '')
+            content = content.strip()
 
-                if content:
-                    posts.append(content)
+            if content:
+                posts.append(content)
 
-            # Ensure we have exactly 3 posts
-            while len(posts) < 3:
-                posts.append(f"📢 {trend_topic}\n\nEz a téma most felkapott! Mit gondolsz róla?")
+        # Ensure we have exactly 3 posts
+        while len(posts) < 3:
+            posts.append(f"📢 {trend_topic}\n\nEz a téma most felkapott! Mit gondolsz róla?")
 
-            print(f"✅ Generated {len(posts)} Facebook posts for: {trend_topic[:50]}... (via Gemini 3)")
+        print(f"✅ Generated {len(posts)} Facebook posts for: {trend_topic[:50]}... (via Gemini 3)")
 
-            return posts[:3]
+        return posts[:3]
 
-        except Exception as e:
-            print(f"❌ Error generating posts with Gemini 3: {e}")
-            # Fallback posts
-            return [
-                f"📊 **{trend_topic}**\n\nEz a téma most a figyelem középpontjában! Érdemes figyelni.",
-                f"🔥 {trend_topic}\n\nAz emberek ezt keresik most! Mit gondolsz, miért lehet ennyire aktuális?",
-                f"💡 **Trending most**: {trend_topic}\n\nÉrdekes kérdés, hogy ez hogyan hat a jövőre."
-            ]
+    @staticmethod
+    def _no_api_posts(trend_topic: str) -> List[str]:
+        """Placeholder posts when Google AI is not configured"""
+        return [
+            f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}",
+            f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}",
+            f"❌ Google AI nem elérhető\n\nTéma: {trend_topic}"
+        ]
+
+    @staticmethod
+    def _fallback_posts(trend_topic: str) -> List[str]:
+        """Generic posts used when the API call fails"""
+        return [
+            f"📊 **{trend_topic}**\n\nEz a téma most a figyelem középpontjában! Érdemes figyelni.",
+            f"🔥 {trend_topic}\n\nAz emberek ezt keresik most! Mit gondolsz, miért lehet ennyire aktuális?",
+            f"💡 **Trending most**: {trend_topic}\n\nÉrdekes kérdés, hogy ez hogyan hat a jövőre."
+        ]
 
     def generate_text(self, prompt: str) -> str:
         """
@@ -303,6 +378,17 @@ class GoogleAIGenerator:
         Returns:
             Path to the generated video file
         """
+        return _loop_thread.run(self.generate_video_async(prompt, duration))
+
+    async def generate_video_async(self, prompt: str, duration: int = 5) -> Optional[str]:
+        """
+        Async variant of generate_video - no thread is held while Veo renders,
+        so several videos can be awaited together with asyncio.gather
+        """
+        if not self.new_client:
+            print("⚠️ Google AI new client not available for video generation")
+            return None
+
         try:
             import tempfile
             import uuid
@@ -332,13 +418,11 @@ class GoogleAIGenerator:
 
             print(f"🧹 Cleaned prompt: {cleaned_prompt[:80]}...")
 
-            # Initialize new GenAI client for Veo
-            api_key = os.getenv('GOOGLE_API_KEY')
-            client = genai_new.Client(api_key=api_key)
+            client = self.new_client
 
             # Step 1: Create video generation job
             print(f"📤 Creating Veo 3.1 video job...")
-            operation = client.models.generate_videos(
+            operation = await client.aio.models.generate_videos(
                 model=self.video_model_name,  # "veo-3.1-generate-preview"
                 prompt=f"Professional social media video: {cleaned_prompt}",
                 config=genai_new.types.GenerateVideosConfig(
@@ -350,21 +434,10 @@ class GoogleAIGenerator:
 
             print(f"✅ Video job created: {operation.name}")
 
-            # Step 2: Poll operation status until completed
-            max_wait_time = 360  # 6 minutes max
-            start_time = time.time()
-            poll_interval = 10  # Check every 10 seconds
-
-            while not operation.done:
-                if time.time() - start_time > max_wait_time:
-                    print(f"❌ Video generation timed out after {max_wait_time}s")
-                    return None
-
-                print(f"⏳ Waiting for video generation to complete...")
-                time.sleep(poll_interval)
-
-                # Refresh operation status
-                operation = client.operations.get(operation)
+            # Step 2: Wait for the operation with backoff polling
+            operation = await self._await_operation(operation)
+            if operation is None:
+                return None
 
             print(f"✅ Video generation completed!")
 
@@ -392,8 +465,7 @@ class GoogleAIGenerator:
             temp_path = os.path.join(temp_dir, temp_filename)
 
             print(f"📥 Downloading video...")
-            client.files.download(file=generated_video.video)
-            generated_video.video.save(temp_path)
+            await asyncio.to_thread(self._save_video, generated_video.video, temp_path)
 
             print(f"✅ Video generated successfully with Veo 3.1")
             print(f"   Saved to: {temp_path}")
@@ -406,6 +478,31 @@ class GoogleAIGenerator:
             traceback.print_exc()
             return None
 
+    async def _await_operation(self, operation, max_wait_time: int = VIDEO_MAX_WAIT):
+        """Poll a Veo operation until done; None on timeout"""
+        start_time = time.monotonic()
+        delay = VIDEO_POLL_MIN_DELAY
+
+        while not operation.done:
+            if time.monotonic() - start_time > max_wait_time:
+                print(f"❌ Video generation timed out after {max_wait_time}s")
+                return None
+
+            print(f"⏳ Waiting for video generation to complete...")
+            await asyncio.sleep(delay)
+            # Short videos finish in seconds - start fast, back off for long renders
+            delay = min(delay * VIDEO_POLL_BACKOFF, VIDEO_POLL_MAX_DELAY)
+
+            # Refresh operation status
+            operation = await self.new_client.aio.operations.get(operation)
+
+        return operation
+
+    def _save_video(self, video, temp_path: str):
+        """Download the generated video bytes and write them to temp_path (blocking)"""
+        self.new_client.files.download(file=video)
+        video.save(temp_path)
+
     def generate_video_prompt_from_post(self, post_text: str) -> str:
         """
         Generate a clean video prompt from Facebook post text
@@ -484,20 +581,31 @@ class GoogleAIGenerator:
         Returns:
             Dictionary mapping trend_id to list of posts
         """
-        results = {}
-
-        for idx, trend in enumerate(trends[:max_trends]):
-            print(f"\n🤖 Generating posts {idx+1}/{min(len(trends), max_trends)} (Gemini 3)")
-
-            trend_id = trend.get('id')
-            topic = trend.get('topic', 'Unknown topic')
-            source = trend.get('source', 'unknown')
-            metadata = trend.get('metadata', '')
+        return _loop_thread.run(self._abatch(trends[:max_trends]))
+
+    async def _abatch(self, trends: List[Dict]) -> Dict[int, List[str]]:
+        """Fire the per-trend calls concurrently (semaphore + QPM bucket instead of sleep(1))"""
+        sem = asyncio.Semaphore(GEMINI_BATCH_CONCURRENCY)
+
+        async def one(idx: int, trend: Dict) -> List[str]:
+            async with sem:
+                print(f"\n🤖 Generating posts {idx+1}/{len(trends)} (Gemini 3)")
+                return await self._agenerate_facebook_posts(
+                    trend.get('topic', 'Unknown topic'),
+                    trend.get('source', 'unknown'),
+                    trend.get('metadata', '')
+                )
 
-            posts = self.generate_facebook_posts(topic, source, metadata)
-            results[trend_id] = posts
+        posts = await asyncio.gather(
+            *(one(idx, trend) for idx, trend in enumerate(trends)),
+            return_exceptions=True
+        )
 
-            # Rate limiting for Google AI
-            time.sleep(1)
+        results = {}
+        for trend, result in zip(trends, posts):
+            if isinstance(result, BaseException):
+                print(f"❌ Error generating posts with Gemini 3: {result}")
+                result = self._fallback_posts(trend.get('topic', 'Unknown topic'))
+            results[trend.get('id')] = result
 
         return results
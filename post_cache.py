@@ -0,0 +1,207 @@
+"""
+Generated post cache for TrendMaster
+Repeated requests (exact cache) and near-duplicate trends - the same story
+from google_hu and youtube_us - (semantic cache) reuse the posts already
+written for them instead of calling the LLM again
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger("trendmaster.cache")
+
+CACHE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'post_cache.db')
+
+# Cosine similarity above which two trends count as the same story
+SEMANTIC_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.93'))
+
+# Initial row capacity of the in-memory embedding matrix (doubles when full)
+INITIAL_CAPACITY = 256
+
+# Trends go stale fast - cached posts are dropped after this many seconds
+CACHE_TTL = int(os.getenv('POST_CACHE_TTL', str(6 * 3600)))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Autocommit connection shared by the loop thread and the Flask workers"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA busy_timeout = 5000')
+    return conn
+
+
+def exact_key(*parts) -> bytes:
+    """16-byte blake2b digest of the request parts (str or bytes)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.digest()
+
+
+def to_unit_vector(embedding: Sequence[float]) -> np.ndarray:
+    """float32 copy of the embedding scaled to length 1 (dot product = cosine)"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticPostCache:
+    """
+    Embedding -> posts cache.
+
+    Rows are persisted in SQLite (float32); in memory the embeddings are one
+    preallocated float32 matrix that grows by doubling, so a lookup is a
+    single BLAS matrix-vector product and an insert is a row copy.
+    """
+
+    def __init__(self, path: str = CACHE_DB_PATH, threshold: float = SEMANTIC_THRESHOLD,
+                 ttl: int = CACHE_TTL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                posts TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self._load()
+
+    def _load(self):
+        """Drop expired rows and pull the rest into memory"""
+        self._conn.execute('DELETE FROM semantic_cache WHERE created_at < ?', (time.time() - self.ttl,))
+        rows = self._conn.execute(
+            'SELECT embedding, posts, created_at FROM semantic_cache ORDER BY id'
+        ).fetchall()
+
+        self._posts = [orjson.loads(row[1]) for row in rows]
+        self._size = len(rows)
+        self._matrix = None
+        self._created = np.empty(max(INITIAL_CAPACITY, self._size), dtype=np.float64)
+        self._created[:self._size] = [row[2] for row in rows]
+        if rows:
+            vectors = [np.frombuffer(row[0], dtype=np.float32) for row in rows]
+            self._matrix = np.empty((len(self._created), len(vectors[0])), dtype=np.float32)
+            self._matrix[:self._size] = vectors
+
+    def _grow(self):
+        """Double the row capacity (amortized O(1) inserts)"""
+        capacity = 2 * len(self._created)
+        matrix = np.empty((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        created = np.empty(capacity, dtype=np.float64)
+        created[:self._size] = self._created[:self._size]
+        self._matrix, self._created = matrix, created
+
+    def lookup(self, embedding: np.ndarray) -> Optional[List[str]]:
+        """Posts of the most similar live entry, if it is above the threshold"""
+        with self._lock:
+            if not self._size:
+                return None
+
+            scores = self._matrix[:self._size] @ embedding
+            scores[self._created[:self._size] < time.time() - self.ttl] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            logger.info("♻️ Semantic cache hit (similarity %.3f)", scores[best])
+            return list(self._posts[best])
+
+    def clear(self):
+        """Drop every entry (the posts were written for a style that changed)"""
+        with self._lock:
+            self._conn.execute('DELETE FROM semantic_cache')
+            self._load()
+
+    def add(self, embedding: np.ndarray, posts: List[str]):
+        """Store freshly generated posts, evicting expired entries on the way"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO semantic_cache (embedding, posts, created_at) VALUES (?, ?, ?)',
+                (embedding.tobytes(), orjson.dumps(posts).decode(), now)
+            )
+
+            if self._size and (self._created[:self._size] < now - self.ttl).any():
+                self._load()
+                return
+
+            if self._matrix is None:
+                self._matrix = np.empty((len(self._created), len(embedding)), dtype=np.float32)
+            elif self._size == len(self._created):
+                self._grow()
+            self._matrix[self._size] = embedding
+            self._created[self._size] = now
+            self._posts.append(list(posts))
+            self._size += 1
+
+
+class ExactPostCache:
+    """Byte-identical requests -> cached answer (posts, image prompt), looked up by primary key"""
+
+    def __init__(self, path: str = CACHE_DB_PATH, ttl: int = CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS exact_cache (
+                key BLOB PRIMARY KEY,
+                posts TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def get(self, key: bytes):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT posts FROM exact_cache WHERE key = ? AND expires_at > ?',
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        logger.info("♻️ Exact cache hit")
+        return orjson.loads(row[0])
+
+    def set(self, key: bytes, posts, ttl: Optional[int] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('DELETE FROM exact_cache WHERE expires_at <= ?', (now,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO exact_cache (key, posts, expires_at) VALUES (?, ?, ?)',
+                (key, orjson.dumps(posts).decode(), now + (ttl or self.ttl))
+            )
+
+
+_semantic_cache = None
+_exact_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticPostCache:
+    """Get or create the global semantic cache instance."""
+    global _semantic_cache
+    with _cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticPostCache()
+    return _semantic_cache
+
+
+def get_exact_cache() -> ExactPostCache:
+    """Get or create the global exact-match cache instance."""
+    global _exact_cache
+    with _cache_lock:
+        if _exact_cache is None:
+            _exact_cache = ExactPostCache()
+    return _exact_cache
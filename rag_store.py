@@ -12,6 +12,9 @@ import json
 # Lazy load sentence-transformers to avoid slow startup
 _embedding_model = None
 
+# Chunks per forward pass when embedding a whole upload
+EMBED_BATCH_SIZE = 64
+
 
 def get_embedding_model():
     """Lazy load the embedding model."""
@@ -31,6 +34,18 @@ def get_embedding_model():
     return _embedding_model
 
 
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed a list of texts in one batched encode() call."""
+    model = get_embedding_model()
+    embeddings = model.encode(
+        texts,
+        batch_size=EMBED_BATCH_SIZE,
+        show_progress_bar=False,
+        convert_to_numpy=True
+    )
+    return embeddings.tolist()
+
+
 class RAGStyleStore:
     """
     ChromaDB-based RAG store for learning influencer writing styles.
@@ -116,9 +131,8 @@ class RAGStyleStore:
         if not chunks:
             return 0
 
-        # Generate embeddings
-        model = get_embedding_model()
-        embeddings = model.encode(chunks).tolist()
+        # Generate embeddings for all chunks in one batched call
+        embeddings = embed_texts(chunks)
 
         # Generate unique IDs based on content hash
         ids = []
@@ -162,8 +176,18 @@ class RAGStyleStore:
         Returns:
             List of matching documents with metadata
         """
-        model = get_embedding_model()
-        query_embedding = model.encode([query_text]).tolist()
+        return self.query_styles([query_text], n_results, source_filter, style_filter)[0]
+
+    def query_styles(self, query_texts: List[str], n_results: int = 5,
+                     source_filter: str = None, style_filter: str = None) -> List[List[Dict]]:
+        """
+        query_style() for several texts: one batched encode() and one
+        collection query for all of them.
+
+        Returns:
+            One result list per query text, in order
+        """
+        query_embeddings = embed_texts(query_texts)
 
         # Build where clause for filtering
         where = None
@@ -180,7 +204,7 @@ class RAGStyleStore:
             where = {"style_name": style_filter}
 
         results = self.collection.query(
-            query_embeddings=query_embedding,
+            query_embeddings=query_embeddings,
             n_results=n_results,
             where=where,
             include=["documents", "metadatas", "distances"]
@@ -188,13 +212,12 @@ class RAGStyleStore:
 
         # Format results
         formatted = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                formatted.append({
-                    "text": doc,
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else 0
-                })
+        for q, docs in enumerate(results['documents'] or [[] for _ in query_texts]):
+            formatted.append([{
+                "text": doc,
+                "metadata": results['metadatas'][q][i] if results['metadatas'] else {},
+                "distance": results['distances'][q][i] if results['distances'] else 0
+            } for i, doc in enumerate(docs or [])])
 
         return formatted
 
@@ -209,8 +232,18 @@ class RAGStyleStore:
         Returns:
             Formatted string with style examples for prompt injection
         """
-        results = self.query_style(query_text, n_results=3)
+        return self.get_style_contexts([query_text], max_tokens)[0]
+
+    def get_style_contexts(self, query_texts: List[str], max_tokens: int = 1000) -> List[str]:
+        """get_style_context() for several topics with one batched query."""
+        return [
+            self._format_style_context(results, max_tokens)
+            for results in self.query_styles(query_texts, n_results=3)
+        ]
 
+    @staticmethod
+    def _format_style_context(results: List[Dict], max_tokens: int) -> str:
+        """Style examples of one query as a prompt block (max_tokens ~ characters)"""
         if not results:
             return ""
 